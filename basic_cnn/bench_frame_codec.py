@@ -0,0 +1,58 @@
+from dataset import EPISODE_SUFFIX, FRAMES_SUFFIX
+from frame_codec import EncodedFrames
+
+import h5py
+import numpy as np
+import os
+from time import perf_counter
+
+TRAIN_DIR = "training"
+BATCH_SIZE = 128
+TRIALS = 20
+
+def recorded_episodes(directory):
+    """
+    Dense frame arrays of every recording in directory.
+    """
+    for file in sorted(os.listdir(directory)):
+        path = os.path.join(directory, file)
+        if file.endswith(EPISODE_SUFFIX):
+            with h5py.File(path, "r") as episode:
+                if "frames" in episode:
+                    yield file, episode["frames"][:]
+                else:
+                    frames = EncodedFrames.from_h5(episode)
+                    out = np.empty((len(frames),) + frames.frame_shape, np.uint8)
+                    frames.decode_into(np.arange(len(frames)), out)
+                    yield file, out
+        elif file.endswith(FRAMES_SUFFIX):
+            yield file, np.load(path)
+
+def time_decode(encoded, batches, out):
+    start = perf_counter()
+    for frame_ids in batches:
+        encoded.decode_into(frame_ids, out)
+    return (perf_counter() - start) / len(batches)
+
+rng = np.random.RandomState(0)
+found = False
+
+print(f"{'recording':>30} {'frames':>7} {'ratio':>7} {'seq (ms)':>9} {'random (ms)':>12}")
+for name, frames in recorded_episodes(TRAIN_DIR) if os.path.isdir(TRAIN_DIR) else []:
+    if len(frames) < BATCH_SIZE:
+        continue
+    found = True
+
+    encoded = EncodedFrames.encode(frames)
+    out = np.empty((BATCH_SIZE,) + frames.shape[1:], np.uint8)
+    sequential = [np.arange(start, start + BATCH_SIZE)
+                  for start in rng.randint(0, len(frames) - BATCH_SIZE + 1, TRIALS)]
+    shuffled = [rng.choice(len(frames), BATCH_SIZE, replace=False) for _ in range(TRIALS)]
+
+    print(f"{name[-30:]:>30} {len(frames):>7} {frames.nbytes / encoded.nbytes:>7.1f} "
+          f"{time_decode(encoded, sequential, out) * 1e3:>9.2f} "
+          f"{time_decode(encoded, shuffled, out) * 1e3:>12.2f}")
+
+if not found:
+    print(f"no recordings of at least {BATCH_SIZE} frames in {TRAIN_DIR}/, "
+          f"run proxy_rush.py to record some")
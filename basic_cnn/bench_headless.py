@@ -0,0 +1,5 @@
+import repo_root
+from shared.headless import bench
+from proxy_rush import ProxyRaxRushBot
+
+bench({"ProxyRaxRushBot": lambda: ProxyRaxRushBot(training=True)}, "random actions")
@@ -0,0 +1,63 @@
+from proxy_rush import ProxyRaxRushBot
+
+import cv2 as cv
+import numpy as np
+import random
+from time import perf_counter
+
+MAP_SIZE = (152, 184)
+ENEMY_COUNTS = [0, 10, 50, 100, 200, 400]
+OWN_COUNT = 40
+TRIALS = 100
+
+class FakeUnit:
+    def __init__(self, type_id, position):
+        self.type_id = type_id
+        self.position = position
+
+    @property
+    def name(self):
+        # sc2 resolves the name through the game data on every access
+        return self.type_id.name.title()
+
+def synthetic_units(count):
+    types = list(ProxyRaxRushBot.UNIT_INTEL)
+    return [FakeUnit(random.choice(types),
+                     (random.uniform(0, MAP_SIZE[0]), random.uniform(0, MAP_SIZE[1])))
+            for _ in range(count)]
+
+def legacy_draw(game_map, own_units, enemy_units):
+    """
+    The original per-frame table rebuild with a types x enemies name scan.
+    """
+    unit_intel = {typ: [intel[0], intel[1], typ.name.lower()]
+                  for typ, intel in ProxyRaxRushBot.UNIT_INTEL.items()}
+    for typ, intel in unit_intel.items():
+        for unit in [u for u in own_units if u.type_id == typ]:
+            posn = unit.position
+            cv.circle(game_map, (int(posn[0]), int(posn[1])), intel[0], intel[1], -1)
+        for unit in enemy_units:
+            if unit.name.lower() != intel[2].lower():
+                continue
+            posn = unit.position
+            x = posn[0]
+            y = posn[1]
+            l = intel[0] * 1.75
+            cv.rectangle(game_map, (int(x), int(y)), (int(x + l), int(y + l)), intel[1], -1)
+
+def time_draw(draw_fn, own_units, enemy_units):
+    start = perf_counter()
+    for _ in range(TRIALS):
+        game_map = np.zeros((MAP_SIZE[1], MAP_SIZE[0], 3), np.uint8)
+        draw_fn(game_map, own_units, enemy_units)
+    return (perf_counter() - start) / TRIALS
+
+random.seed(0)
+own_units = synthetic_units(OWN_COUNT)
+
+print(f"{'enemies':>8} {'legacy (us)':>12} {'type id (us)':>13} {'speedup':>8}")
+for count in ENEMY_COUNTS:
+    enemy_units = synthetic_units(count)
+    legacy = time_draw(legacy_draw, own_units, enemy_units)
+    lookup = time_draw(ProxyRaxRushBot.draw_units, own_units, enemy_units)
+    print(f"{count:>8} {legacy * 1e6:>12.1f} {lookup * 1e6:>13.1f} {legacy / lookup:>7.1f}x")
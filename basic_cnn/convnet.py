@@ -3,40 +3,43 @@ from keras.models import Sequential
 from keras.layers import Dense, Dropout, Flatten
 from keras.layers import Conv2D, MaxPooling2D
 from keras.callbacks import TensorBoard
-import os
+from dataset import ShardDataset, convert_legacy_files
+
+import math
 import numpy as np
-import random
 
 TRAIN_DIR = "training"
 
-# https://stackoverflow.com/questions/55890813/how-to-fix-object-arrays-cannot-be-loaded-when-allow-pickle-false-for-imdb-loa/56243777
-# save np load
-np_load_old = np.load
-
-# modify the default parameters of np.load
-np.load = lambda *a,**k: np_load_old(*a, allow_pickle=True, **k)
-
 class Model:
-    def __init__(self):
+    def __init__(self, input_shape=(184, 152, 3)):
+        """
+        :param input_shape: <tuple> (height, width, channels) of a uint8 
+        frame, RGB drawings or feature planes.
+        """
+        self.input_shape = tuple(input_shape)
         self.model = Sequential()
 
         # hidden conv net layers
         num_layers = [32, 64, 128]
         specify_shape = True
+        size = min(self.input_shape[:2])
         for num_layer in num_layers:
             if specify_shape:
                 self.model.add(Conv2D(num_layer, 
                                       (3, 3), 
                                       padding='same', 
-                                      input_shape=(184, 152, 3), 
+                                      input_shape=self.input_shape, 
                                       activation='relu'))
                 specify_shape = False
             else:
                 self.model.add(
                     Conv2D(num_layer, (3, 3), padding='same', activation='relu'))
 
-            self.model.add(Conv2D(num_layer, (3, 3), activation='relu'))
-            self.model.add(MaxPooling2D(pool_size=(2, 2)))
+            # small feature planes run out of resolution before the last block
+            if size - 2 >= 2:
+                self.model.add(Conv2D(num_layer, (3, 3), activation='relu'))
+                self.model.add(MaxPooling2D(pool_size=(2, 2)))
+                size = (size - 2) // 2
             self.model.add(Dropout(0.2))
 
         # fully connected dense layer
@@ -58,74 +61,34 @@ class Model:
         # log everything via tensorboard
         self.tensorboard = TensorBoard(log_dir="logs/v0.1")
 
-    def fit(self, epochs):
-        index = 0
-
-        files = os.listdir(TRAIN_DIR)
-        size = len(files)
+    def fit(self, epochs, dataset=None):
+        if dataset is None:
+            convert_legacy_files(TRAIN_DIR)
+            dataset = ShardDataset(TRAIN_DIR)
+        if tuple(dataset.frame_shape) != self.input_shape:
+            raise ValueError(f"frames are {tuple(dataset.frame_shape)}, "
+                             f"the model takes {self.input_shape}")
 
-        step_size = 5
         test_size = 100
         batch_size = 128
 
         for _ in range(epochs):
-            random.shuffle(files)
-
-            while index < size:
-                attack_none = []
-                attack_enemy_structures = []
-                attack_enemy_units = []
-                attack_enemy_start = []
-
-                lengths = [0, 0, 0, 0]
-
-                for file in files[index:index+step_size]:
-                    path = os.path.join(TRAIN_DIR, file)
-                    data = list(np.load(path))
-                    for d in data:
-                        choice = np.argmax(d[0])
-                        lengths[choice] += 1
-                        if choice == 0:
-                            attack_none.append(d)
-                        elif choice == 1:
-                            attack_enemy_structures.append(d)
-                        elif choice == 2:
-                            attack_enemy_units.append(d)
-                        elif choice == 3:
-                            attack_enemy_start.append(d)
-
-                random.shuffle(attack_none)
-                random.shuffle(attack_enemy_structures)
-                random.shuffle(attack_enemy_units)
-                random.shuffle(attack_enemy_start)
-
-                min_choice = min(lengths)
-
-                attack_none = attack_none[:min_choice]
-                attack_enemy_structures = attack_enemy_structures[:min_choice]
-                attack_enemy_units = attack_enemy_units[:min_choice]
-                attack_enemy_start = attack_enemy_start[:min_choice]
-
-                training = attack_none + attack_enemy_structures \
-                + attack_enemy_units + attack_enemy_start
-
-                random.shuffle(training)
-
-                training_x = np.array([i[1] for i in training[:-test_size]]).reshape(-1, 184, 152, 3)
-                training_y = np.array([i[0] for i in training[:-test_size]])
-
-                testing_x = np.array([i[1] for i in training[-test_size:]]).reshape(-1, 184, 152, 3)
-                testing_y = np.array([i[0] for i in training[-test_size:]])
-
-                self.model.fit(training_x, 
-                               training_y,
-                               batch_size=batch_size,
-                               validation_data=(testing_x, testing_y),
-                               shuffle=True,
-                               verbose=1, 
-                               callbacks=[self.tensorboard])
-                self.model.save(f'CNN-{epochs}-epoch-{self.alpha}-alpha')
-                index += step_size
-
-model = Model()
-model.fit(10)
\ No newline at end of file
+            # rebalancing only reshuffles indices; frames stay on disk
+            indices = dataset.balanced_indices()
+            training = indices[:-test_size]
+            testing_x, testing_y = dataset.gather(indices[-test_size:])
+
+            # batches are prefetched by the dataset, so keras reads them inline
+            self.model.fit_generator(dataset.batches(training, batch_size),
+                                     steps_per_epoch=math.ceil(len(training) / batch_size),
+                                     validation_data=(testing_x, testing_y),
+                                     verbose=1, 
+                                     callbacks=[self.tensorboard],
+                                     workers=0)
+            self.model.save(f'CNN-{epochs}-epoch-{self.alpha}-alpha')
+
+# the network is sized to whatever frames were recorded
+convert_legacy_files(TRAIN_DIR)
+dataset = ShardDataset(TRAIN_DIR)
+model = Model(dataset.frame_shape)
+model.fit(10, dataset)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+
+from frame_codec import EncodedFrames
+
+import h5py
+import numpy as np
+
+EPISODE_SUFFIX = ".h5"
+FRAMES_SUFFIX = "-frames.npy"
+LABELS_SUFFIX = "-labels.npy"
+NUM_CLASSES = 4
+
+def write_shard(directory, name, frames, labels):
+    """
+    Writes one shard: a uint8 (N, 184, 152, 3) frame array and an int8 (N,)
+    array of chosen action labels, as plain (non pickled) .npy files.
+    """
+    np.save(os.path.join(directory, name + FRAMES_SUFFIX), np.asarray(frames, np.uint8))
+    np.save(os.path.join(directory, name + LABELS_SUFFIX), np.asarray(labels, np.int8))
+
+def convert_legacy_files(directory):
+    """
+    Converts pickled [[onehot, frame], ...] .npy recordings in directory into
+    shards, moving the originals into directory/legacy.
+    """
+    legacy_dir = os.path.join(directory, "legacy")
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".npy") or file.endswith(FRAMES_SUFFIX) \
+        or file.endswith(LABELS_SUFFIX):
+            continue
+
+        path = os.path.join(directory, file)
+        data = np.load(path, allow_pickle=True)
+        write_shard(directory,
+                    file[:-len(".npy")],
+                    np.stack([d[1] for d in data]),
+                    np.array([np.argmax(d[0]) for d in data]))
+
+        os.makedirs(legacy_dir, exist_ok=True)
+        os.rename(path, os.path.join(legacy_dir, file))
+
+class ShardDataset:
+    """
+    Training data spread over many shards, read through memory maps (or
+    chunk by chunk for recorded .h5 episodes) so only the frames of the
+    current batch are paged in.
+
+    Samples are addressed by a global index; class balancing and shuffling
+    only ever permute index arrays, never the frames themselves.
+    """
+
+    def __init__(self, directory, num_classes=NUM_CLASSES):
+        self.num_classes = num_classes
+        self.frames = []
+        labels = []
+
+        for file in sorted(os.listdir(directory)):
+            path = os.path.join(directory, file)
+            if file.endswith(EPISODE_SUFFIX):
+                episode = h5py.File(path, "r")
+                if "frame_indices" in episode:
+                    # sparse pairs are read per batch, like dense chunks
+                    self.frames.append(EncodedFrames.from_h5(episode))
+                else:
+                    self.frames.append(episode["frames"])
+                labels.append(episode["labels"][:])
+            elif file.endswith(FRAMES_SUFFIX):
+                name = file[:-len(FRAMES_SUFFIX)]
+                self.frames.append(np.load(path, mmap_mode="r"))
+                labels.append(np.load(os.path.join(directory, name + LABELS_SUFFIX)))
+
+        lengths = [len(shard) for shard in labels]
+        self.labels = np.concatenate(labels) if labels else np.zeros(0, np.int8)
+        self.shards = np.repeat(np.arange(len(lengths)), lengths)
+        self.rows = np.concatenate([np.arange(n) for n in lengths]) \
+            if lengths else np.zeros(0, np.intp)
+        self.frame_shape = (184, 152, 3)
+        if self.frames:
+            first = self.frames[0]
+            self.frame_shape = first.frame_shape \
+                if isinstance(first, EncodedFrames) else first.shape[1:]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def balanced_indices(self, rng=np.random):
+        """
+        Shuffled sample indices with every class cut down to the size of the
+        rarest one.
+        """
+        by_class = [np.flatnonzero(self.labels == choice)
+                    for choice in range(self.num_classes)]
+        min_choice = min(len(indices) for indices in by_class)
+
+        balanced = np.concatenate([rng.choice(indices, min_choice, replace=False)
+                                   for indices in by_class])
+        rng.shuffle(balanced)
+        return balanced
+
+    def gather(self, indices, out=None):
+        """
+        Reads the given samples into out (allocated if None).
+
+        :return: <tuple> (frames, onehot labels)
+        """
+        if out is None:
+            out = np.empty((len(indices),) + self.frame_shape, np.uint8)
+        out = out[:len(indices)]
+
+        # read each shard once, in file order (h5py also requires this)
+        shards = self.shards[indices]
+        for shard in np.unique(shards):
+            positions = np.flatnonzero(shards == shard)
+            rows = self.rows[indices[positions]]
+            if isinstance(self.frames[shard], EncodedFrames):
+                self.frames[shard].decode_into(rows, out, positions)
+                continue
+            order = np.argsort(rows)
+            out[positions[order]] = self.frames[shard][rows[order]]
+
+        onehot = np.zeros((len(indices), self.num_classes), np.float32)
+        onehot[np.arange(len(indices)), self.labels[indices]] = 1
+        return out, onehot
+
+    def batches(self, indices, batch_size, prefetch=4):
+        """
+        Yields (frames, onehot labels) batches over indices, gathered ahead
+        of time on a background thread into a small pool of reused buffers.
+        A yielded batch stays valid until prefetch more have been yielded.
+        """
+        buffers = [np.empty((batch_size,) + self.frame_shape, np.uint8)
+                   for _ in range(prefetch + 2)]
+        ready = queue.Queue(maxsize=prefetch)
+
+        def produce():
+            for batch, start in enumerate(range(0, len(indices), batch_size)):
+                ready.put(self.gather(indices[start:start + batch_size],
+                                      out=buffers[batch % len(buffers)]))
+            ready.put(None)
+
+        threading.Thread(target=produce, daemon=True).start()
+        while True:
+            batch = ready.get()
+            if batch is None:
+                return
+            yield batch
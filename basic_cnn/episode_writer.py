@@ -0,0 +1,137 @@
+from frame_codec import FrameEncoder
+
+import h5py
+import numpy as np
+
+import os
+from time import time
+
+class EpisodeWriter:
+    """
+    Streams one game's frames and labels into a chunked, compressed HDF5 file
+    while the game is running.
+
+    Frames are collected into a preallocated chunk buffer and written out one
+    compressed chunk at a time, so memory use stays constant no matter how
+    long the game runs. The file holds a uint8 "frames" dataset, an int8
+    "labels" dataset and metadata attributes, and needs no pickle to load.
+
+    With codec="sparse" frames are instead stored as keyframes plus deltas
+    (see frame_codec) in "frame_offsets", "frame_indices" and "frame_values"
+    datasets, to be read back with EncodedFrames.from_h5.
+    """
+
+    def __init__(self, path, frame_shape=(184, 152, 3), chunk_frames=64, codec=None,
+                 **metadata):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.file = h5py.File(self.partial_path, "w")
+        self.encoder = None
+
+        if codec == "sparse":
+            self.encoder = FrameEncoder(frame_shape)
+            self.file.attrs["frame_shape"] = frame_shape
+            self.file.attrs["keyframe_interval"] = self.encoder.keyframe_interval
+            self.frame_offsets = self._stream("frame_offsets", np.int64, chunk_frames)
+            self.frame_offsets.resize(1, axis=0)
+            self.frame_indices = self._stream("frame_indices", np.uint32, 64 * 1024)
+            self.frame_values = self._stream("frame_values", np.uint8, 64 * 1024)
+            self._pending = []
+        elif codec is None:
+            self.frames = self.file.create_dataset(
+                "frames",
+                shape=(0,) + tuple(frame_shape),
+                maxshape=(None,) + tuple(frame_shape),
+                chunks=(chunk_frames,) + tuple(frame_shape),
+                dtype=np.uint8,
+                compression="gzip",
+                compression_opts=4,
+                shuffle=True)
+        else:
+            raise ValueError(f"unknown frame codec {codec}")
+
+        self.labels = self.file.create_dataset(
+            "labels",
+            shape=(0,),
+            maxshape=(None,),
+            chunks=(chunk_frames,),
+            dtype=np.int8,
+            compression="gzip")
+
+        self.file.attrs["created"] = time()
+        for key, value in metadata.items():
+            self.file.attrs[key] = value
+
+        if self.encoder is None:
+            self._frame_buffer = np.empty((chunk_frames,) + tuple(frame_shape), np.uint8)
+        self._label_buffer = np.empty(chunk_frames, np.int8)
+        self._buffered = 0
+
+    def _stream(self, name, dtype, chunk):
+        return self.file.create_dataset(name,
+                                        shape=(0,),
+                                        maxshape=(None,),
+                                        chunks=(chunk,),
+                                        dtype=dtype,
+                                        compression="gzip")
+
+    def __len__(self):
+        return len(self.labels) + self._buffered
+
+    def append(self, frame, label):
+        if self.encoder is None:
+            self._frame_buffer[self._buffered] = frame
+        else:
+            self._pending.append(self.encoder.encode(frame))
+        self._label_buffer[self._buffered] = label
+        self._buffered += 1
+        if self._buffered == len(self._label_buffer):
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+
+        start = len(self.labels)
+        end = start + self._buffered
+        self.labels.resize(end, axis=0)
+        self.labels[start:end] = self._label_buffer[:self._buffered]
+
+        if self.encoder is None:
+            self.frames.resize(end, axis=0)
+            self.frames[start:end] = self._frame_buffer[:self._buffered]
+        else:
+            self._flush_encoded()
+        self._buffered = 0
+
+    def _flush_encoded(self):
+        counts = [len(indices) for indices, _ in self._pending]
+        first = self.frame_offsets[-1]
+        offsets = first + np.cumsum(counts)
+
+        self._append(self.frame_offsets, offsets)
+        self._append(self.frame_indices, np.concatenate([i for i, _ in self._pending]))
+        self._append(self.frame_values, np.concatenate([v for _, v in self._pending]))
+        self._pending = []
+
+    @staticmethod
+    def _append(dataset, values):
+        start = len(dataset)
+        dataset.resize(start + len(values), axis=0)
+        dataset[start:] = values
+
+    def close(self, **metadata):
+        """
+        Flushes remaining frames, records final metadata (e.g. the result)
+        and moves the finished file into place.
+        """
+        self.flush()
+        for key, value in metadata.items():
+            self.file.attrs[key] = value
+        self.file.attrs["num_frames"] = len(self.labels)
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.partial_path)
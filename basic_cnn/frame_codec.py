@@ -0,0 +1,121 @@
+import numpy as np
+
+KEYFRAME_INTERVAL = 32
+
+class FrameEncoder:
+    """
+    Sparse encoder for a stream of minimap frames.
+
+    Every keyframe_interval-th frame is a keyframe stored as its non zero
+    bytes; every other frame is stored as the bytes that changed since the
+    previous frame, along with their new values. Both are (flat index,
+    value) pairs, so one decoder loop handles either kind.
+    """
+
+    def __init__(self, frame_shape, keyframe_interval=KEYFRAME_INTERVAL):
+        self.frame_shape = tuple(frame_shape)
+        self.keyframe_interval = keyframe_interval
+        self._previous = np.zeros(int(np.prod(frame_shape)), np.uint8)
+        self.count = 0
+
+    def encode(self, frame):
+        """
+        :return: <tuple> (uint32 flat indices, uint8 values) for the frame.
+        """
+        flat = np.ravel(frame)
+        if self.count % self.keyframe_interval == 0:
+            indices = np.flatnonzero(flat)
+        else:
+            indices = np.flatnonzero(flat != self._previous)
+
+        self._previous[:] = flat
+        self.count += 1
+        return indices.astype(np.uint32), flat[indices]
+
+class EncodedFrames:
+    """
+    A sparse encoded frame sequence. Frame i's pairs are
+    indices[offsets[i]:offsets[i + 1]] and values[offsets[i]:offsets[i + 1]].
+
+    indices and values may be h5py datasets, in which case decoding reads
+    only the pairs of the frames it rebuilds.
+    """
+
+    def __init__(self, offsets, indices, values, frame_shape,
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        self.offsets = np.asarray(offsets, np.int64)
+        self.indices = indices if hasattr(indices, "dtype") else np.asarray(indices, np.uint32)
+        self.values = values if hasattr(values, "dtype") else np.asarray(values, np.uint8)
+        self.frame_shape = tuple(frame_shape)
+        self.keyframe_interval = keyframe_interval
+
+    @classmethod
+    def encode(cls, frames, keyframe_interval=KEYFRAME_INTERVAL):
+        encoder = FrameEncoder(frames.shape[1:], keyframe_interval)
+        encoded = [encoder.encode(frame) for frame in frames]
+
+        offsets = np.zeros(len(frames) + 1, np.int64)
+        offsets[1:] = np.cumsum([len(indices) for indices, _ in encoded])
+        indices = np.concatenate([indices for indices, _ in encoded]) \
+            if encoded else np.zeros(0, np.uint32)
+        values = np.concatenate([values for _, values in encoded]) \
+            if encoded else np.zeros(0, np.uint8)
+        return cls(offsets, indices, values, frames.shape[1:], keyframe_interval)
+
+    @classmethod
+    def from_h5(cls, episode):
+        """
+        Opens the encoded frames of an EpisodeWriter file written with
+        codec="sparse". Only the offsets are read up front; the file must
+        stay open while frames are decoded.
+        """
+        return cls(episode["frame_offsets"][:],
+                   episode["frame_indices"],
+                   episode["frame_values"],
+                   episode.attrs["frame_shape"],
+                   int(episode.attrs["keyframe_interval"]))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.indices.nbytes + self.values.nbytes
+
+    def decode_into(self, frame_ids, out, positions=None):
+        """
+        Reconstructs frames straight into a preallocated buffer.
+
+        Requests are served in frame order, so frames that share a keyframe
+        are rebuilt incrementally rather than each from its keyframe, and
+        the pairs of each run of frames are read in one slice.
+
+        :param frame_ids: <np.ndarray> frames to decode.
+        :param out: <np.ndarray> (M, *frame_shape) uint8 buffer.
+        :param positions: <np.ndarray> slot in out for each frame id; defaults
+        to 0..len(frame_ids) - 1.
+        """
+        frame_ids = np.asarray(frame_ids)
+        if positions is None:
+            positions = np.arange(len(frame_ids))
+
+        current = np.zeros(int(np.prod(self.frame_shape)), np.uint8)
+        current_id = -1
+        for order in np.argsort(frame_ids, kind="stable"):
+            target = int(frame_ids[order])
+            keyframe = target - target % self.keyframe_interval
+
+            if current_id < keyframe or current_id > target:
+                current.fill(0)
+                current_id = keyframe - 1
+
+            first = current_id + 1
+            if first <= target:
+                base, end = self.offsets[first], self.offsets[target + 1]
+                indices, values = self.indices[base:end], self.values[base:end]
+                for frame in range(first, target + 1):
+                    start, stop = self.offsets[frame] - base, self.offsets[frame + 1] - base
+                    current[indices[start:stop]] = values[start:stop]
+            current_id = target
+
+            out[positions[order]] = current.reshape(self.frame_shape)
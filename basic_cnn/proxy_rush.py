@@ -1,46 +1,135 @@
+import repo_root
 import sc2
 from sc2 import BotAI, Race, Difficulty, Result
 from sc2.constants import *
 from sc2.helpers import ControlGroup
 from sc2.player import Bot, Computer
 
+from episode_writer import EpisodeWriter
+from shared.profiler import make_profiler
+from shared.metrics_log import MetricsLog
+from shared.inference import Predictor
+from shared.unit_selections import UnitSelections
+from shared.spatial_index import StepIndices
+from shared.map_analysis import MapAnalysis
+from shared.observation_capture import ObservationCapture
+from shared.feature_planes import FeaturePlaneEncoder, unit_positions
+
 import cv2 as cv
 import numpy as np
 import keras
 
+import multiprocessing
 import random
 from time import time
 
 ITERATIONS_PER_MINUTE = 165
 NUM_EPISODES = 100
+# game i is seeded with SEED + i; set it to a logged seed to replay a run
+SEED = int(time())
 TRAIN_DIR = "training"
 VISUALIZE = False
+# frames as downsampled uint8 feature planes instead of drawn RGB images
+FEATURE_PLANES = False
+MAP_SIZE = (152, 184)
+FRAME_SHAPE = FeaturePlaneEncoder(MAP_SIZE).shape if FEATURE_PLANES else (184, 152, 3)
+TRAINING = False
+# games played in parallel worker processes; 1 plays them in this process
+NUM_COLLECTORS = 1
+# per-phase on_step latency histograms, summarized into PROFILE_LOG per game
+PROFILE = False
+PROFILE_LOG = "profile.log"
+# one fixed-schema record per game; read it with metrics_log.read_metrics
+METRICS_LOG = f"{TRAIN_DIR}/metrics-{'training' if TRAINING else 'model'}.bin"
+# when set, every observation of a game is captured to 
+# CAPTURE_DIR/seed-<seed>.obs.gz for replay with ObservationReplay
+CAPTURE_DIR = None
+# on_step phases with their own column in the metrics log
+PHASES = [
+    "choose_action", "last_stand", "prepare_attack", "manage_workers", 
+    "manage_supply", "manage_military_training_structures", "train_military", 
+    "visualize", "task_workers"
+]
+
+DEPOT_TYPES = [SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP]
 
 class ProxyRaxRushBot(sc2.BotAI):
 
-    def __init__(self, training=True):
-        self.states = []
+    # <dict> [UnitId: (int, tuple)] drawing size and BGR color per unit type.
+    UNIT_INTEL = {
+        COMMANDCENTER: (12, (0, 255, 0)),
+        NEXUS:         (12, (0, 255, 0)),
+        HATCHERY:      (12, (0, 255, 0)),
+
+        SUPPLYDEPOT:        (3, (55, 120, 0)),
+        SUPPLYDEPOTLOWERED: (3, (55, 120, 0)),
+        PYLON:              (3, (55, 120, 0)),
+        OVERSEER:           (3, (55, 120, 0)),
+        OVERLORD:           (3, (55, 120, 0)),
+
+        REFINERY:    (3, (100, 100, 100)),
+        ASSIMILATOR: (3, (100, 100, 100)),
+
+        BARRACKS: (5, (200, 40, 0)),
+        GATEWAY: (5, (200, 40, 0)),
+        CYBERNETICSCORE: (5, (175, 45, 40)),
+        ROBOTICSFACILITY: (5, (128, 32, 32)),
+
+        MARINE: (1, (0, 0, 240)),
+        ZEALOT: (1, (0, 0, 240)),
+        ZERGLING: (1, (0, 0, 240)),
+        STALKER: (1, (0, 75, 215)),
+        OBSERVER: (1, (65, 60, 30)),
+
+        SCV:   (1, (34, 237, 200)),
+        PROBE: (1, (34, 237, 200)),
+        DRONE: (1, (34, 237, 200))
+    }
+
+    def __init__(self, training=True, recorder=None, capture=None):
+        """
+        :param recorder: <EpisodeWriter> optional sink that every frame and 
+        its chosen action are streamed to.
+        :param capture: <ObservationCapture> optional sink for every 
+        observation the bot sees.
+        """
+        self.capture = capture
+        self.recorder = recorder
         self.training = training
         self.flipped = None
+        self.encoder = None
         self.next_actionable = 0
+        self.profiler = make_profiler(PROFILE)
+        self.selections = UnitSelections()
+        self.spatial = StepIndices(self)
+        self.map_analysis = None
 
         if not self.training:
             self.model = keras.models.load_model("CNN-10-epoch-0.0001-alpha")
+            self.predict = Predictor(self.model)
 
     async def on_step(self, iteration):
+        if self.capture is not None:
+            self.capture.record(self, iteration)
+        self.selections.reset(self.units)
+        self.spatial.reset()
+        if self.map_analysis is None:
+            self.map_analysis = MapAnalysis.load(self)
         self.iteration = iteration
         self.attack_waves = set()
+        profiler = self.profiler
 
-        if self.training or self.flipped is None:
-            self.action = random.randrange(4)
-        else:
-            prediction = self.model.predict([self.flipped.reshape([-1, 184, 152, 3])])
-            self.action = np.argmax(prediction[0])
+        with profiler.phase("choose_action"):
+            if self.training or self.flipped is None:
+                self.action = random.randrange(4)
+            else:
+                self.action = np.argmax(self.predict(self.flipped))
 
         if not self.townhalls.exists:
-            for unit in self.workers | self.marines:
-                if self.target:
-                    await self.do(unit.attack(self.target))
+            with profiler.phase("last_stand"):
+                for unit in self.workers | self.marines:
+                    if self.target:
+                        await self.do(unit.attack(self.target))
             return
         self.command_center = self.townhalls.first
 
@@ -48,90 +137,109 @@ class ProxyRaxRushBot(sc2.BotAI):
             MARINE: 15
         }
 
-        # note that colors are in BGR representation
-        self.unit_intel = {
-            COMMANDCENTER: [12, (0, 255, 0), "commandcenter"],
-            NEXUS:         [12, (0, 255, 0), "nexus"],
-            HATCHERY:      [12, (0, 255, 0), "hatchery"],
-
-            SUPPLYDEPOT:        [3, (55, 120, 0), "supplydepot"],
-            SUPPLYDEPOTLOWERED: [3, (55, 120, 0), "supplydepotlowered"],
-            PYLON:              [3, (55, 120, 0), "pylon"],
-            OVERSEER:           [3, (55, 120, 0), "overseer"],
-            OVERLORD:           [3, (55, 120, 0), "overlord"],
-
-            REFINERY:    [3, (100, 100, 100), "refinery"],
-            ASSIMILATOR: [3, (100, 100, 100), "assimilator"],
-
-            BARRACKS: [5, (200, 40, 0), "barracks"],
-            GATEWAY: [5, (200, 40, 0), "gateway"],
-            CYBERNETICSCORE: [5, (175, 45, 40), "cyberneticscore"],
-            ROBOTICSFACILITY: [5, (128, 32, 32), "cyberneticscore"],
-
-            MARINE: [1, (0, 0, 240), "marine"],
-            ZEALOT: [1, (0, 0, 240), "zealot"],
-            ZERGLING: [1, (0, 0, 240), "zergling"],
-            STALKER: [1, (0, 75, 215), "stalker"],
-            OBSERVER: [1, (65, 60, 30), "observer"],
-
-            SCV:   [1, (34, 237, 200), "scv"],
-            PROBE: [1, (34, 237, 200), "probe"],
-            DRONE: [1, (34, 237, 200), "drone"]
-        }
-
         # if self.iteration < self.next_actionable:
         #     return
 
-        self.prepare_attack(military)
-        await self.manage_workers()
-        await self.manage_supply()
-        await self.manage_military_training_structures()
-        await self.train_military()
-        await self.visualize()
-        await self.attack()
-        await self.task_workers()
+        with profiler.phase("prepare_attack"):
+            self.prepare_attack(military)
+        with profiler.phase("manage_workers"):
+            await self.manage_workers()
+        with profiler.phase("manage_supply"):
+            await self.manage_supply()
+        with profiler.phase("manage_military_training_structures"):
+            await self.manage_military_training_structures()
+        with profiler.phase("train_military"):
+            await self.train_military()
+        with profiler.phase("visualize"):
+            await self.visualize()
+        with profiler.phase(f"action.attack.{self.action}"):
+            await self.attack()
+        with profiler.phase("task_workers"):
+            await self.task_workers()
 
     async def visualize(self):
-        game_map = np.zeros((self.game_info.map_size[1], self.game_info.map_size[0], 3), np.uint8)
-        await self.visualize_map(game_map)
-        await self.visualize_resources(game_map)
-
-        # cv assumes (0, 0) top-left => need to flip along horizontal axis
-        self.flipped = cv.flip(game_map, 0)
-        params = np.zeros(4)
-        params[self.action] = 1
+        if FEATURE_PLANES:
+            # planes are already in image orientation
+            self.flipped = self.encode_planes().copy()
+            scale = 2 * self.encoder.downsample
+        else:
+            game_map = np.zeros((self.game_info.map_size[1], self.game_info.map_size[0], 3), np.uint8)
+            await self.visualize_map(game_map)
+            await self.visualize_resources(game_map)
 
-        self.states.append([params, self.flipped])
+            # cv assumes (0, 0) top-left => need to flip along horizontal axis
+            self.flipped = cv.flip(game_map, 0)
+            scale = 2
+        if self.recorder is not None:
+            self.recorder.append(self.flipped, self.action)
 
         if VISUALIZE:
             key = 'Training Map' if self.training else 'Model Map'
-            cv.imshow(key, cv.resize(flipped, dsize=None, fx=2, fy=2))
+            # the first three planes are shown as color channels
+            cv.imshow(key, cv.resize(np.ascontiguousarray(self.flipped[..., :3]), 
+                                     dsize=None, fx=scale, fy=scale, 
+                                     interpolation=cv.INTER_NEAREST))
             cv.waitKey(1)
 
+    def encode_planes(self):
+        """
+        :return: <np.ndarray> the state as feature planes, in the order of 
+        feature_planes.SPATIAL_PLANES and SCALAR_PLANES.
+        """
+        if self.encoder is None:
+            self.encoder = FeaturePlaneEncoder(self.game_info.map_size)
+        own = self.units.ready
+        enemies = self.known_enemy_units
+        resources = self.state.mineral_field | self.state.vespene_geyser
+        return self.encoder.encode(
+            [unit_positions(group) for group in [own.not_structure, own.structure, 
+                                                 enemies.not_structure, enemies.structure, 
+                                                 resources]],
+            self.resource_levels())
+
     async def visualize_map(self, game_map):
-        # game coordinates need to be represented as (y, x) in 2d arrays
-        for typ, intel in self.unit_intel.items():
-            for unit in self.units(typ).ready:
-                posn = unit.position
-                cv.circle(game_map, (int(posn[0]), int(posn[1])), intel[0], intel[1], -1)
-            for unit in self.known_enemy_units:
-                if unit.name.lower() != intel[2].lower():
-                    continue
-                posn = unit.position
-                x = posn[0]
-                y = posn[1]
-                l = intel[0] * 1.75
-                cv.rectangle(game_map, (int(x), int(y)), (int(x + l), int(y + l)), intel[1], -1)
+        self.draw_units(game_map, self.units.ready, self.known_enemy_units)
 
-    async def visualize_resources(self, game_map):
-        line_scalar = 40
+    @classmethod
+    def draw_units(cls, game_map, own_units, enemy_units):
+        """
+        Draws own units as circles and enemy units as squares, looking up 
+        each unit's size and color by type id in a single pass.
+        """
+        # game coordinates need to be represented as (y, x) in 2d arrays
+        for unit in own_units:
+            intel = cls.UNIT_INTEL.get(unit.type_id)
+            if intel is None:
+                continue
+            posn = unit.position
+            cv.circle(game_map, (int(posn[0]), int(posn[1])), intel[0], intel[1], -1)
+
+        for unit in enemy_units:
+            intel = cls.UNIT_INTEL.get(unit.type_id)
+            if intel is None:
+                continue
+            posn = unit.position
+            x = posn[0]
+            y = posn[1]
+            l = intel[0] * 1.75
+            cv.rectangle(game_map, (int(x), int(y)), (int(x + l), int(y + l)), intel[1], -1)
+
+    def resource_levels(self):
+        """
+        :return: <tuple> minerals, vespene, free supply, supply cap and 
+        military share of used supply, each scaled to [0, 1].
+        """
         minerals = min(1.0, self.minerals / 1200)
         vespene = min(1.0, self.vespene / 1200)
         pop_space = min(1.0, self.supply_left / self.supply_cap)
         supply_usage = self.supply_cap / 200
         military = (self.supply_cap - self.supply_left - self.workers.amount) \
         / (self.supply_cap - self.supply_left)
+        return minerals, vespene, pop_space, supply_usage, military
 
+    async def visualize_resources(self, game_map):
+        line_scalar = 40
+        minerals, vespene, pop_space, supply_usage, military = self.resource_levels()
 
         cv.line(game_map, (0, 16), (int(line_scalar*minerals), 16), (255, 40, 37), 2)  
         cv.line(game_map, (0, 12), (int(line_scalar*vespene), 12), (25, 240, 20), 2)
@@ -147,35 +255,24 @@ class ProxyRaxRushBot(sc2.BotAI):
     async def manage_supply(self):
         supply_threshold = 2 if self.barracks.amount < 3 else 5
 
-        supply_units = self.units.of_type([
-            SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-        ])
+        supply_units = self.selections(DEPOT_TYPES)
 
         if self.can_afford(SUPPLYDEPOT):
             if supply_units.amount < 1 or \
             (self.supply_left < supply_threshold and 
                 self.already_pending(SUPPLYDEPOT) < 2):
-                position = self.command_center.position.towards(
-                    self.game_info.map_center, 5)
+                position = self.map_analysis.depot_position(
+                    self.command_center.position, self.game_info.map_center)
                 await self.build(SUPPLYDEPOT, position)
 
     async def manage_military_training_structures(self): 
-        if not self.units.of_type([
-            SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-            ]).ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return   
 
         if self.barracks.amount < 3 or \
         (self.barracks.amount < 6 and self.minerals > 400):
             if self.can_afford(BARRACKS):
-                game_info = self.game_info
-                position = game_info.map_center.towards(
-                    self.enemy_start_locations[0], 25)
-                await self.build(BARRACKS, near=position)
+                await self.build(BARRACKS, near=self.map_analysis.proxy_barracks[0])
 
     def prepare_attack(self, military_ratio):
         """
@@ -188,13 +285,13 @@ class ProxyRaxRushBot(sc2.BotAI):
         attack_wave = None
         for unit in military_ratio:
             amount = military_ratio[unit]
-            units = self.units(unit)
+            idle = self.selections.idle(unit)
 
-            if units.idle.amount >= amount:
+            if idle.amount >= amount:
                 if attack_wave is None:
-                    attack_wave = ControlGroup(units.idle)
+                    attack_wave = ControlGroup(idle)
                 else:
-                    attack_wave.add_units(units.idle)
+                    attack_wave.add_units(idle)
         if attack_wave is not None:
             self.attack_waves.add(attack_wave)
 
@@ -217,12 +314,12 @@ class ProxyRaxRushBot(sc2.BotAI):
                 self.attack_waves.remove(wave)
 
     async def task_workers(self):
-        min_field = self.state.mineral_field.closest_to(self.command_center)
-        for scv in self.units(SCV).idle:
+        min_field = self.spatial.minerals.closest_to(self.command_center)
+        for scv in self.selections.idle(SCV):
             await self.do(scv.gather(min_field))
 
     async def train_military(self):
-        for rax in self.barracks.ready.noqueue:
+        for rax in self.selections.ready_noqueue(BARRACKS):
             if not self.can_afford(MARINE):
                 break
             await self.do(rax.train(MARINE))
@@ -235,17 +332,17 @@ class ProxyRaxRushBot(sc2.BotAI):
         if self.action == 1 and len(self.known_enemy_structures) > 0:
             return random.choice(self.known_enemy_structures).position
         elif self.action == 2 and len(self.known_enemy_units) > 0 and self.townhalls.exists:
-            return self.known_enemy_units.closest_to(random.choice(self.townhalls)).position
+            return self.spatial.enemies.closest_to(random.choice(self.townhalls)).position
         elif self.action == 3:
             return self.enemy_start_locations[0].position
 
     @property
     def barracks(self):
-        return self.units(BARRACKS)
+        return self.selections(BARRACKS)
     
     @property
     def marines(self):
-        return self.units(MARINE)
+        return self.selections(MARINE)
 
     @property
     def minutes_elapsed(self):
@@ -261,19 +358,57 @@ class ProxyRaxRushBot(sc2.BotAI):
         """
         return self.minutes_elapsed * 60
 
-for _ in range(NUM_EPISODES):
-    training = False
-    bot = ProxyRaxRushBot(training=training)
+def play_episode(seed):
+    """
+    Plays one game; run directly or in a collector worker process. Frames
+    are streamed to disk during the game and only kept for wins.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+    recorder = EpisodeWriter(f'{TRAIN_DIR}/{int(time())}-{seed}.h5',
+                             map="(2)RedshiftLE",
+                             training=TRAINING,
+                             seed=seed,
+                             frame_shape=FRAME_SHAPE,
+                             codec="sparse")
+    capture = ObservationCapture(f"{CAPTURE_DIR}/seed-{seed}.obs.gz") if CAPTURE_DIR else None
+    bot = ProxyRaxRushBot(training=TRAINING, recorder=recorder, capture=capture)
+    started = time()
     result = sc2.run_game(sc2.maps.get("(2)RedshiftLE"), [
         Bot(Race.Terran, bot),
         Computer(Race.Protoss, Difficulty.VeryHard)
         ], realtime=False)
 
-    if result == Result.Victory:
-        np.save(f'{TRAIN_DIR}/{int(time())}.npy', np.array(bot.states))
-
-    with open("results.log", "a") as log:
-        if training:
-            log.write(f"Training = {result}\n")
+    if capture is not None:
+        capture.close()
+    bot.profiler.write_summary(PROFILE_LOG, f"seed: {seed}, result: {result}")
+    if result == Result.Victory and len(recorder) > 0:
+        recorder.close(result=str(result))
+    else:
+        recorder.discard()
+
+    stats = {
+        "seed": seed,
+        "steps": bot.iteration + 1,
+        "wall_time": time() - started,
+        "phase_totals": bot.profiler.totals()
+    }
+    return seed, str(result), stats
+
+if __name__ == "__main__":
+    metrics = MetricsLog(METRICS_LOG, PHASES)
+    try:
+        if NUM_COLLECTORS > 1:
+            # each worker is a fresh interpreter with its own game client
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(NUM_COLLECTORS) as pool:
+                seeds = range(SEED, SEED + NUM_EPISODES)
+                for seed, result, stats in pool.imap_unordered(play_episode, seeds):
+                    metrics.append(seed - SEED, result, **stats)
         else:
-            log.write(f"Model = {result}\n")
\ No newline at end of file
+            for seed in range(SEED, SEED + NUM_EPISODES):
+                seed, result, stats = play_episode(seed)
+                metrics.append(seed - SEED, result, **stats)
+    finally:
+        metrics.close()
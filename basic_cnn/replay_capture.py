@@ -0,0 +1,17 @@
+import repo_root
+from shared.observation_capture import replay_into
+from proxy_rush import ProxyRaxRushBot
+
+import sys
+
+def replay(path, start=0, stop=None):
+    """
+    Replays a capture into a fresh ProxyRaxRushBot choosing random actions;
+    see observation_capture.replay_into.
+    """
+    replay_into(ProxyRaxRushBot(training=True), "ProxyRaxRushBot", path, start, stop)
+
+if __name__ == "__main__":
+    # replay_capture.py <capture> [start] [stop]
+    bounds = [int(arg) for arg in sys.argv[2:4]]
+    replay(sys.argv[1], *bounds)
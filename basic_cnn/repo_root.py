@@ -0,0 +1,10 @@
+"""
+Puts the repository root on sys.path, so scripts run from this folder can
+import the shared package. Import it before anything from shared.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,11 @@
+import repo_root
+import model
+from model import DQNModel
+from shared.headless import bench, BENCH_STEPS
+from terran_ai import TerranBot, STATE_SHAPE
+
+model.LOAD = False
+dqn = DQNModel(list(range(TerranBot.NUM_ACTIONS)), state_shape=STATE_SHAPE, 
+               memory_size=BENCH_STEPS)
+
+bench({"TerranBot": lambda: TerranBot(dqn, train=False)}, "inline training off")
@@ -0,0 +1,40 @@
+import repo_root
+import model
+from model import DQNModel
+from shared.inference import Predictor
+
+import numpy as np
+from time import perf_counter
+
+NUM_ACTIONS = 43
+DECISIONS = 500
+WARMUP = 20
+
+def time_decisions(decide, states):
+    for state in states[:WARMUP]:
+        decide(state)
+
+    timings = np.empty(len(states))
+    for i, state in enumerate(states):
+        start = perf_counter()
+        decide(state)
+        timings[i] = perf_counter() - start
+    return timings
+
+model.LOAD = False
+# only acts, so the replay memory need not hold anything
+dqn = DQNModel(list(range(NUM_ACTIONS)), memory_size=1)
+predictor = Predictor(dqn.policy_model)
+states = np.random.randint(0, 256, (DECISIONS, 1, 184, 152, 3)).astype(np.uint8)
+
+assert np.allclose(dqn.policy_model.predict(states[0])[0], predictor(states[0]), atol=1e-5)
+
+legacy = time_decisions(lambda state: np.argmax(dqn.policy_model.predict(state)[0]), states)
+fast = time_decisions(lambda state: np.argmax(predictor(state)), states)
+
+print(f"{DECISIONS} single-frame decisions")
+print(f"{'':12} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+for name, timings in [("predict", legacy), ("predictor", fast)]:
+    print(f"{name:12} {np.percentile(timings, 50) * 1e3:>9.2f} "
+          f"{np.percentile(timings, 99) * 1e3:>9.2f}")
+print(f"p50 speedup: {np.percentile(legacy, 50) / np.percentile(fast, 50):.1f}x")
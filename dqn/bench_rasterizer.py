@@ -0,0 +1,55 @@
+from rasterizer import StateRasterizer, OWN_COLOR, ENEMY_COLOR
+
+import cv2 as cv
+import numpy as np
+from time import perf_counter
+
+MAP_SIZE = (152, 184)
+UNIT_COUNTS = [10, 50, 100, 250, 500]
+# radii of common units: marine, scv, marauder, depot, barracks, cc
+UNIT_RADII = [0.375, 0.375, 0.5625, 1.0, 1.8125, 2.75]
+TRIALS = 200
+
+def synthetic_units(count, rng):
+    positions = rng.uniform(0, 1, (count, 2)) * MAP_SIZE
+    radii = rng.choice(UNIT_RADII, count)
+    return positions.astype(np.float32), radii.astype(np.float32)
+
+def legacy_frame(own, enemy):
+    """
+    The original allocate / cv.circle per unit / flip pipeline.
+    """
+    game_map = np.zeros((MAP_SIZE[1], MAP_SIZE[0], 3), np.uint8)
+    for (positions, radii), color in ((own, OWN_COLOR), (enemy, ENEMY_COLOR)):
+        for posn, radius in zip(positions, radii):
+            cv.circle(game_map, (int(posn[0]), int(posn[1])), int(radius*8), color, int(radius*0.5))
+    return cv.flip(game_map, 0).reshape([-1, MAP_SIZE[1], MAP_SIZE[0], 3])
+
+def rasterized_frame(rasterizer, own, enemy):
+    rasterizer.clear()
+    rasterizer.draw_units(*own, OWN_COLOR)
+    rasterizer.draw_units(*enemy, ENEMY_COLOR)
+    return rasterizer.frame[np.newaxis].copy()
+
+def time_frames(frame_fn, *args):
+    frame_fn(*args)
+    start = perf_counter()
+    for _ in range(TRIALS):
+        frame_fn(*args)
+    return (perf_counter() - start) / TRIALS
+
+rng = np.random.RandomState(0)
+rasterizer = StateRasterizer(MAP_SIZE)
+
+print(f"{'units':>6} {'legacy (us)':>12} {'vectorized (us)':>16} {'speedup':>8} {'pixel agreement':>16}")
+for count in UNIT_COUNTS:
+    own = synthetic_units(count // 2, rng)
+    enemy = synthetic_units(count - count // 2, rng)
+
+    legacy = time_frames(legacy_frame, own, enemy)
+    vectorized = time_frames(rasterized_frame, rasterizer, own, enemy)
+    agreement = np.mean(
+        legacy_frame(own, enemy) == rasterized_frame(rasterizer, own, enemy))
+
+    print(f"{count:>6} {legacy * 1e6:>12.1f} {vectorized * 1e6:>16.1f} "
+          f"{legacy / vectorized:>7.1f}x {agreement:>15.2%}")
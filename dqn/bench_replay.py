@@ -0,0 +1,93 @@
+import model
+from model import DQNModel
+
+import numpy as np
+from time import perf_counter
+
+BATCH_SIZE = 80
+NUM_TRANSITIONS = 400
+NUM_ACTIONS = 43
+TRIALS = 5
+
+def legacy_replay(dqn, batch_size):
+    """
+    The original per-transition replay loop, kept here as the baseline.
+    """
+    states, actions, rewards, next_states, dones = dqn.memory.sample(batch_size)
+    for state, action, reward, next_state, done in zip(
+            states, actions, rewards, next_states, dones):
+        state = state[np.newaxis]
+        next_state = next_state[np.newaxis]
+        target = dqn.target_model.predict(state)
+        if done:
+            target[0][action] = reward
+        else:
+            q_next = max(dqn.target_model.predict(next_state)[0])
+            target[0][action] = reward + q_next * dqn.gamma
+        dqn.model.fit(state, target, epochs=1, verbose=0)
+
+def legacy_train_target_model(dqn):
+    """
+    The original target sync, copying weights through python lists.
+    """
+    weights = dqn.model.get_weights()
+    target_weights = dqn.target_model.get_weights()
+    for i in range(len(target_weights)):
+        target_weights[i] = weights[i]
+    dqn.target_model.set_weights(target_weights)
+
+def time_sync(sync_fn):
+    sync_fn()
+    timings = []
+    for _ in range(TRIALS):
+        start = perf_counter()
+        sync_fn()
+        timings.append(perf_counter() - start)
+    return np.median(timings)
+
+def time_replay(replay_fn, dqn):
+    # first call builds the keras predict/train functions
+    replay_fn(dqn, BATCH_SIZE)
+
+    timings = []
+    for _ in range(TRIALS):
+        start = perf_counter()
+        replay_fn(dqn, BATCH_SIZE)
+        timings.append(perf_counter() - start)
+    return np.median(timings)
+
+def fill_memory(dqn):
+    state = np.random.randint(0, 256, (1, 184, 152, 3)).astype(np.uint8)
+    for _ in range(NUM_TRANSITIONS):
+        next_state = np.random.randint(0, 256, (1, 184, 152, 3)).astype(np.uint8)
+        dqn.remember(state,
+                     np.random.randint(NUM_ACTIONS),
+                     np.random.rand(),
+                     next_state,
+                     np.random.rand() < 0.01)
+        state = next_state
+
+model.LOAD = False
+dqn = DQNModel(list(range(NUM_ACTIONS)), memory_size=NUM_TRANSITIONS)
+fill_memory(dqn)
+
+print(f"memory:       {len(dqn.memory)} transitions, {dqn.memory.nbytes / 2**30:.2f} GiB")
+
+legacy = time_replay(legacy_replay, dqn)
+batched = time_replay(DQNModel.replay, dqn)
+dqn.double = True
+double = time_replay(DQNModel.replay, dqn)
+dqn.double = False
+
+legacy_sync = time_sync(lambda: legacy_train_target_model(dqn))
+bulk_sync = time_sync(dqn.train_target_model)
+soft_sync_target = dqn._target_sync_function(0.005)
+soft_sync = time_sync(lambda: soft_sync_target([]))
+
+print(f"batch size:   {BATCH_SIZE}")
+print(f"per-sample:   {legacy * 1000:.1f} ms/replay")
+print(f"batched:      {batched * 1000:.1f} ms/replay")
+print(f"speedup:      {legacy / batched:.1f}x")
+print(f"double dqn:   {double * 1000:.1f} ms/replay")
+print(f"target sync:  {legacy_sync * 1000:.1f} ms per-layer copy, "
+      f"{bulk_sync * 1000:.1f} ms bulk, {soft_sync * 1000:.1f} ms polyak")
@@ -0,0 +1,135 @@
+import repo_root
+from shared.unit_selections import UnitSelections
+
+import random
+from time import perf_counter
+
+NUM_UNITS = 200
+STEPS = 2000
+
+# stand in type ids; the real ones are UnitTypeId members
+SCV, MARINE, MARAUDER, MEDIVAC, HELLION, BARRACKS, BARRACKSTECHLAB, FACTORY, \
+    STARPORT, SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP, COMMANDCENTER, \
+    ORBITALCOMMAND, REFINERY = range(15)
+DEPOT_TYPES = [SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP]
+MILITARY_TYPES = [MARINE, MARAUDER, MEDIVAC, HELLION]
+
+# a mid game terran army and base, roughly
+TYPE_WEIGHTS = {
+    SCV: 50, MARINE: 60, MARAUDER: 25, MEDIVAC: 8, HELLION: 12, BARRACKS: 8,
+    BARRACKSTECHLAB: 4, FACTORY: 2, STARPORT: 2, SUPPLYDEPOT: 6,
+    SUPPLYDEPOTLOWERED: 14, COMMANDCENTER: 2, ORBITALCOMMAND: 1, REFINERY: 6
+}
+
+class FakeUnit:
+    def __init__(self, type_id):
+        self.type_id = type_id
+        self.is_ready = random.random() < 0.9
+        self.orders = [] if random.random() < 0.5 else [None]
+
+    @property
+    def is_idle(self):
+        return not self.orders
+
+    @property
+    def noqueue(self):
+        return not self.orders
+
+class FakeUnits(list):
+    """
+    The parts of sc2's Units the bots use: every selection refilters.
+    """
+
+    def __call__(self, unit_types):
+        return self.of_type(unit_types)
+
+    def of_type(self, unit_types):
+        if not isinstance(unit_types, (list, set)):
+            unit_types = {unit_types}
+        return self.filter(lambda unit: unit.type_id in unit_types)
+
+    def filter(self, pred):
+        return self.subgroup(filter(pred, self))
+
+    def subgroup(self, units):
+        return FakeUnits(units)
+
+    def __or__(self, other):
+        tags = {id(unit) for unit in self}
+        return self.subgroup(self + [unit for unit in other if id(unit) not in tags])
+
+    @property
+    def amount(self):
+        return len(self)
+
+    @property
+    def exists(self):
+        return bool(self)
+
+    @property
+    def ready(self):
+        return self.filter(lambda unit: unit.is_ready)
+
+    @property
+    def idle(self):
+        return self.filter(lambda unit: unit.is_idle)
+
+    @property
+    def noqueue(self):
+        return self.filter(lambda unit: unit.noqueue)
+
+def legacy_step(units):
+    """
+    The selections TerranBot touches in one step with the old inline calls.
+    """
+    units(BARRACKSTECHLAB).ready
+    units(MEDIVAC).idle.amount
+    units(MEDIVAC).idle
+    for unit in [MARINE, MARAUDER, HELLION]:
+        units(unit).idle.amount
+    for unit in [MARINE, MARAUDER, HELLION]:
+        units(unit).idle
+    units(MARINE) | units(MARAUDER) | units(MEDIVAC) | units(HELLION)
+    units(SUPPLYDEPOT).ready
+    # a typical action: manage_starports
+    units.of_type(DEPOT_TYPES).ready.exists
+    units(BARRACKS).ready.exists
+    units(FACTORY).ready.exists
+    units(STARPORT).amount
+    units.of_type(DEPOT_TYPES).ready
+    units(BARRACKS).ready.noqueue
+
+def cached_step(units, selections):
+    selections.reset(units)
+    selections.ready(BARRACKSTECHLAB)
+    selections.idle(MEDIVAC).amount
+    selections.idle(MEDIVAC)
+    for unit in [MARINE, MARAUDER, HELLION]:
+        selections.idle(unit).amount
+    for unit in [MARINE, MARAUDER, HELLION]:
+        selections.idle(unit)
+    selections(MILITARY_TYPES)
+    selections.ready(SUPPLYDEPOT)
+    selections.ready(DEPOT_TYPES).exists
+    selections.ready(BARRACKS).exists
+    selections.ready(FACTORY).exists
+    selections(STARPORT).amount
+    selections.ready(DEPOT_TYPES)
+    selections.ready_noqueue(BARRACKS)
+
+def time_steps(step_fn, *args):
+    start = perf_counter()
+    for _ in range(STEPS):
+        step_fn(*args)
+    return (perf_counter() - start) / STEPS
+
+random.seed(0)
+types = list(TYPE_WEIGHTS)
+units = FakeUnits(FakeUnit(typ) for typ in
+                  random.choices(types, [TYPE_WEIGHTS[t] for t in types], k=NUM_UNITS))
+
+legacy = time_steps(legacy_step, units)
+cached = time_steps(cached_step, units, UnitSelections())
+print(f"{NUM_UNITS} units, selections per step")
+print(f"inline filters: {legacy * 1e6:8.1f} us")
+print(f"memoized:       {cached * 1e6:8.1f} us ({legacy / cached:.1f}x)")
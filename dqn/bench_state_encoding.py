@@ -0,0 +1,65 @@
+import repo_root
+import model
+from model import DQNModel, MEMORY_SIZE
+from shared.inference import Predictor
+from rasterizer import StateRasterizer, OWN_COLOR, ENEMY_COLOR
+from shared.feature_planes import FeaturePlaneEncoder, SPATIAL_PLANES
+from replay_memory import FRAME_SHAPE
+
+import numpy as np
+from time import perf_counter
+
+MAP_SIZE = (152, 184)
+NUM_UNITS = 300
+NUM_ACTIONS = 43
+BATCH_SIZE = 32
+DECISIONS = 200
+TRIALS = 20
+DOWNSAMPLES = [2, 4, 8]
+
+def median_seconds(fn, trials):
+    fn()
+    timings = []
+    for _ in range(trials):
+        start = perf_counter()
+        fn()
+        timings.append(perf_counter() - start)
+    return np.median(timings)
+
+rng = np.random.RandomState(0)
+positions = (rng.uniform(0, 1, (NUM_UNITS, 2)) * MAP_SIZE).astype(np.float32)
+radii = rng.choice([0.375, 0.5625, 1.0, 1.8125, 2.75], NUM_UNITS).astype(np.float32)
+groups = np.array_split(positions, len(SPATIAL_PLANES))
+scalars = rng.uniform(0, 1, 5)
+
+rasterizer = StateRasterizer(MAP_SIZE)
+def draw():
+    rasterizer.clear()
+    rasterizer.draw_units(positions[:NUM_UNITS // 2], radii[:NUM_UNITS // 2], OWN_COLOR)
+    rasterizer.draw_units(positions[NUM_UNITS // 2:], radii[NUM_UNITS // 2:], ENEMY_COLOR)
+
+encodings = [("rgb frames", FRAME_SHAPE, draw)]
+for downsample in DOWNSAMPLES:
+    encoder = FeaturePlaneEncoder(MAP_SIZE, downsample)
+    encodings.append((f"planes /{downsample}", encoder.shape,
+                      lambda encoder=encoder: encoder.encode(groups, scalars)))
+
+model.LOAD = False
+print(f"{NUM_UNITS} units, train batch {BATCH_SIZE}, replay memory of {MEMORY_SIZE} frames")
+print(f"{'state':12} {'shape':>14} {'encode (us)':>12} {'infer (ms)':>11} "
+      f"{'train (ms/sample)':>18} {'replay (GiB)':>13}")
+for name, shape, encode in encodings:
+    dqn = DQNModel(list(range(NUM_ACTIONS)), state_shape=shape, memory_size=1)
+    predictor = Predictor(dqn.model)
+    states = rng.randint(0, 256, (BATCH_SIZE,) + tuple(shape)).astype(np.uint8)
+    targets = rng.uniform(0, 1, (BATCH_SIZE, NUM_ACTIONS)).astype(np.float32)
+
+    encode_seconds = median_seconds(encode, DECISIONS)
+    infer_seconds = median_seconds(lambda: predictor(states[0]), DECISIONS)
+    train_seconds = median_seconds(lambda: dqn.model.train_on_batch(states, targets), TRIALS)
+    # what a full MEMORY_SIZE frame ring would take, without allocating it
+    replay_bytes = (MEMORY_SIZE + 1) * int(np.prod(shape))
+
+    print(f"{name:12} {str(tuple(shape)):>14} {encode_seconds * 1e6:>12.1f} "
+          f"{infer_seconds * 1e3:>11.2f} {train_seconds / BATCH_SIZE * 1e3:>18.2f} "
+          f"{replay_bytes / 2**30:>13.2f}")
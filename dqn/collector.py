@@ -0,0 +1,59 @@
+import multiprocessing
+import queue
+from time import time
+
+class Collector:
+    """
+    Plays games in a pool of worker processes and streams their results back
+    to the calling process as they finish.
+
+    Each worker is a fresh (spawned) interpreter, so it builds its own bot,
+    Keras session and SC2 client; python-sc2 picks free ports for every
+    client it launches, so concurrent games don't collide. Episodes are
+    submitted one at a time as slots free up, which lets the arguments of
+    later episodes (e.g. epsilon) depend on results seen so far.
+    """
+
+    def __init__(self, play_fn, concurrency, base_seed=None):
+        """
+        :param play_fn: <function> top level function run in the workers as
+        play_fn(episode, seed, *args).
+        :param concurrency: <int> number of games played at once.
+        :param base_seed: <int> episode i is seeded with base_seed + i. 
+        Defaults to the current time, so runs don't repeat each other.
+        """
+        self.play_fn = play_fn
+        self.concurrency = concurrency
+        self.base_seed = base_seed if base_seed is not None else int(time())
+
+    def run(self, num_episodes, make_args, on_result):
+        """
+        :param num_episodes: <int> total number of games to play.
+        :param make_args: <function> make_args(episode) returning a tuple of
+        extra arguments for play_fn, called right before submission.
+        :param on_result: <function> called in this process with each
+        result, in completion order.
+        """
+        results = queue.Queue()
+        context = multiprocessing.get_context("spawn")
+
+        with context.Pool(self.concurrency) as pool:
+            submitted = 0
+
+            def submit():
+                nonlocal submitted
+                args = (submitted, self.base_seed + submitted) + tuple(make_args(submitted))
+                pool.apply_async(self.play_fn, args,
+                                 callback=results.put, error_callback=results.put)
+                submitted += 1
+
+            for _ in range(min(self.concurrency, num_episodes)):
+                submit()
+
+            for _ in range(num_episodes):
+                result = results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                on_result(result)
+                if submitted < num_episodes:
+                    submit()
@@ -0,0 +1,50 @@
+class DecisionScheduler:
+    """
+    Decides on which game steps the agent observes, acts and learns.
+
+    A decision is due once at least frame_skip game loops have passed
+    since the last one and the agent can act at all; on the steps in
+    between the last action is repeated (or nothing is done) and the
+    step rewards are summed, so the next transition carries the reward
+    of everything its action led to. Steps skipped while the agent is
+    on standby therefore cost no frame, no forward pass and no
+    transition.
+    """
+
+    def __init__(self, frame_skip, repeat_action=True):
+        """
+        :param frame_skip: <int> minimum game loops between decisions; 0
+        decides on every step.
+        :param repeat_action: <bool> keep executing the last chosen action
+        on skipped steps instead of doing nothing.
+        """
+        self.frame_skip = frame_skip
+        self.repeat_action = repeat_action
+        self.last_decision = None
+        self.reward = 0.0
+        self.skipped = 0
+        self.decisions = 0
+
+    def due(self, game_loop, actionable):
+        """
+        :return: <bool> whether the agent decides on this step. The first
+        step is always a decision, so there is a state to act on.
+        """
+        if self.last_decision is not None and \
+        (not actionable or game_loop - self.last_decision < self.frame_skip):
+            self.skipped += 1
+            return False
+
+        self.last_decision = game_loop
+        self.decisions += 1
+        return True
+
+    def accumulate(self, reward):
+        self.reward += reward
+
+    def take_reward(self):
+        """
+        :return: <float> reward summed since the last call.
+        """
+        reward, self.reward = self.reward, 0.0
+        return reward
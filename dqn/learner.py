@@ -0,0 +1,136 @@
+from keras import backend as K
+
+import queue
+import threading
+from time import time
+
+class AsyncLearner(threading.Thread):
+    """
+    Background thread that owns replay memory and training for a DQNModel.
+
+    The game loop only pushes transitions onto a queue and acts with a
+    separate policy network, whose weights are published by the learner
+    every sync_freq train steps and picked up by the game loop through
+    sync_policy. Replay and target updates then never block a game step.
+    """
+
+    def __init__(self, dqn, batch_size, update_target_freq, sync_freq=50, replay_ratio=1.0):
+        """
+        :param replay_ratio: <float> most train steps per transition pushed, 
+        so the learner waits for new data instead of overfitting a small 
+        memory (and annealing the PER beta) while the game loop is slow.
+        """
+        super().__init__(daemon=True)
+        self.dqn = dqn
+        self.batch_size = batch_size
+        self.update_target_freq = update_target_freq
+        self.sync_freq = sync_freq
+        self.replay_ratio = replay_ratio
+
+        self.transitions = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        # keras models are bound to the graph they were built in
+        self.graph = K.get_session().graph
+
+        # the game loop acts with its own copy of the online network
+        self.policy_model = dqn.build_neural_network_model(print_summary=False)
+        self.policy_model.set_weights(dqn.model.get_weights())
+        self.policy_model._make_predict_function()
+        dqn.policy_model = self.policy_model
+
+        self.steps = 0
+        self.received = 0
+        self.policy_step = 0
+        self._published = None
+        self._started_at = None
+
+    def push(self, state, action, reward, next_state, done):
+        self.transitions.put((state, action, reward, next_state, done))
+
+    def end_episode(self):
+        """
+        Queues DQNModel.end_episode behind the episode's transitions.
+        """
+        self.transitions.put(None)
+
+    def sync_policy(self):
+        """
+        Loads the most recently published weights into the policy network.
+        Must be called from the thread that acts with the policy.
+        """
+        with self.lock:
+            published, self._published = self._published, None
+        if published is not None:
+            weights, self.policy_step = published
+            self.policy_model.set_weights(weights)
+
+    def save(self, name):
+        with self.lock:
+            self.dqn.save(name)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def metrics(self):
+        """
+        :return: <dict> queue depth, learner steps per second and policy
+        staleness in learner steps.
+        """
+        elapsed = time() - self._started_at if self._started_at else 0
+        return {
+            "queue_depth": self.transitions.qsize(),
+            "steps_per_sec": self.steps / elapsed if elapsed > 0 else 0.0,
+            "staleness": self.steps - self.policy_step
+        }
+
+    def run(self):
+        self._started_at = time()
+        with self.graph.as_default():
+            while not self.stopped.is_set():
+                self._drain()
+                if not self._can_replay():
+                    continue
+
+                # epsilon decays with acting in the game loop, not per replay
+                with self.lock:
+                    self.dqn.replay(self.batch_size, decay_epsilon=False)
+                    self.steps += 1
+
+                    if self.steps % self.update_target_freq == 0:
+                        self.dqn.train_target_model()
+                    if self.steps % self.sync_freq == 0:
+                        self._published = (self.dqn.model.get_weights(), self.steps)
+
+            # keep whatever the game loop queued before stopping
+            self._drain()
+
+    def _can_replay(self):
+        if self.steps >= self.received * self.replay_ratio:
+            return False
+
+        # the memory DQNModel.replay will sample must fill a whole batch
+        memory = self.dqn.memory
+        store = self.dqn.replay_store
+        if store is not None and len(store) >= self.batch_size:
+            memory = store
+        return len(memory) >= self.batch_size
+
+    def _drain(self):
+        # block briefly only when there is nothing new to train on
+        block = not self._can_replay()
+        while True:
+            try:
+                transition = self.transitions.get(block=block, timeout=0.1)
+            except queue.Empty:
+                return
+            block = False
+
+            if transition is None:
+                with self.lock:
+                    self.dqn.end_episode()
+            else:
+                self.dqn.remember(*transition)
+                self.received += 1
@@ -0,0 +1,201 @@
+import repo_root
+from shared.metrics_log import read_metrics, RESULT_CODES
+
+import os
+import re
+
+import numpy as np
+
+CHUNK_BYTES = 1 << 20
+RESULT_PATTERN = re.compile(
+    rb"episode: (\d+)/\d+, epsilon: ([^,]+), reward: ([^,]+), result: Result\.(\w+)")
+
+def rolling_mean(data, window_size, cumsum=None):
+    """
+    Trailing rolling mean; the first window_size - 1 entries average over
+    what is available so far, so the output has the same size as data.
+
+    :param cumsum: <np.ndarray> optional precomputed [0, cumsum(data)...].
+    """
+    if cumsum is None:
+        cumsum = np.concatenate([[0.0], np.cumsum(data, dtype=np.float64)])
+    n = len(cumsum) - 1
+    ends = np.arange(1, n + 1)
+    starts = np.maximum(ends - window_size, 0)
+    return (cumsum[ends] - cumsum[starts]) / (ends - starts)
+
+class ResultsLog:
+    """
+    Typed columns parsed from a results.log, read in chunks and kept up to
+    date by tailing: update only parses what was appended since the last
+    call.
+
+    Columns are episode, epsilon, returns and wins, each a 1-d array view
+    of the records parsed so far.
+    """
+
+    def __init__(self, path, chunk_bytes=CHUNK_BYTES):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.offset = 0
+        self.size = 0
+
+        capacity = 1024
+        self._episode = np.zeros(capacity, np.int32)
+        self._epsilon = np.zeros(capacity, np.float32)
+        self._returns = np.zeros(capacity, np.float64)
+        self._wins = np.zeros(capacity, np.bool_)
+        # running [0, cumsum...] so rolling windows never rescan the log
+        self._returns_cumsum = np.zeros(capacity + 1, np.float64)
+        self._wins_cumsum = np.zeros(capacity + 1, np.float64)
+
+        self.update()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def episode(self):
+        return self._episode[:self.size]
+
+    @property
+    def epsilon(self):
+        return self._epsilon[:self.size]
+
+    @property
+    def returns(self):
+        return self._returns[:self.size]
+
+    @property
+    def wins(self):
+        return self._wins[:self.size]
+
+    def update(self):
+        """
+        Parses the complete lines appended since the last update.
+
+        :return: <int> number of new records.
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        added = 0
+        with open(self.path, "rb") as log:
+            log.seek(self.offset)
+            while True:
+                chunk = log.read(self.chunk_bytes)
+                end = chunk.rfind(b"\n") + 1
+                if end == 0:
+                    # a partial last line is picked up once it is finished
+                    if len(chunk) == self.chunk_bytes:
+                        raise ValueError(f"line longer than {self.chunk_bytes} bytes in {self.path}")
+                    break
+
+                self.offset += end
+                log.seek(self.offset)
+                added += self._append(RESULT_PATTERN.findall(chunk[:end]))
+        return added
+
+    def _append(self, records):
+        if not records:
+            return 0
+
+        episode, epsilon, returns, result = zip(*records)
+        start, end = self.size, self.size + len(records)
+        self._reserve(end)
+
+        self._episode[start:end] = np.array(episode, np.int32)
+        self._epsilon[start:end] = np.array(epsilon, np.float32)
+        self._returns[start:end] = np.array(returns, np.float64)
+        self._wins[start:end] = np.array(result) == b"Victory"
+
+        self._returns_cumsum[start + 1:end + 1] = \
+            self._returns_cumsum[start] + np.cumsum(self._returns[start:end])
+        self._wins_cumsum[start + 1:end + 1] = \
+            self._wins_cumsum[start] + np.cumsum(self._wins[start:end])
+        self.size = end
+        return len(records)
+
+    def _reserve(self, size):
+        capacity = len(self._episode)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+
+        for name in ["_episode", "_epsilon", "_returns", "_wins"]:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        for name in ["_returns_cumsum", "_wins_cumsum"]:
+            column = getattr(self, name)
+            grown = np.zeros(capacity + 1, column.dtype)
+            grown[:self.size + 1] = column[:self.size + 1]
+            setattr(self, name, grown)
+
+    def rolling_returns(self, window_size):
+        return rolling_mean(None, window_size, self._returns_cumsum[:self.size + 1])
+
+    def rolling_win_rate(self, window_size):
+        return rolling_mean(None, window_size, self._wins_cumsum[:self.size + 1])
+
+    def rolling_epsilon(self, window_size):
+        return rolling_mean(self.epsilon, window_size)
+
+class MetricsReader:
+    """
+    ResultsLog's interface over a binary metrics log: columns are views of
+    the memory mapped records, and update just remaps the grown file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = ()
+        self._returns_cumsum = np.zeros(1)
+        self._wins_cumsum = np.zeros(1)
+        self.update()
+
+    def __len__(self):
+        return len(self.records)
+
+    def update(self):
+        """
+        :return: <int> number of new records.
+        """
+        previous = len(self.records)
+        self.records, self.phases = read_metrics(self.path)
+
+        # only the new records are summed
+        self._returns_cumsum = np.concatenate([
+            self._returns_cumsum,
+            self._returns_cumsum[-1] + np.cumsum(self.returns[previous:], dtype=np.float64)])
+        self._wins_cumsum = np.concatenate([
+            self._wins_cumsum,
+            self._wins_cumsum[-1] + np.cumsum(self.wins[previous:], dtype=np.float64)])
+        return len(self.records) - previous
+
+    @property
+    def episode(self):
+        return self.records["episode"]
+
+    @property
+    def epsilon(self):
+        return self.records["epsilon"]
+
+    @property
+    def returns(self):
+        return self.records["reward"]
+
+    @property
+    def wins(self):
+        return self.records["result"] == RESULT_CODES["Result.Victory"]
+
+    def rolling_returns(self, window_size):
+        return rolling_mean(None, window_size, self._returns_cumsum)
+
+    def rolling_win_rate(self, window_size):
+        return rolling_mean(None, window_size, self._wins_cumsum)
+
+    def rolling_epsilon(self, window_size):
+        return rolling_mean(self.epsilon, window_size)
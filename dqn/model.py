@@ -1,114 +1,288 @@
+import repo_root
 import keras
-from keras.models import Sequential
-from keras.layers import Dense, Dropout, Flatten, Conv2D, MaxPooling2D
+from keras import backend as K
+from keras.models import Sequential, Model
+from keras.layers import Dense, Dropout, Flatten, Conv2D, MaxPooling2D, Lambda
 from keras.callbacks import TensorBoard
 
+from replay_memory import ReplayMemory, PrioritizedReplayMemory, FRAME_SHAPE
+from shared.inference import Predictor
+
 import os
 import numpy as np
 import random
 
-from collections import deque
-
 LOAD = True
+# weights the constructor starts from when LOAD is set; see checkpoint_name
+CHECKPOINT = "training/terran-dqn.h5"
+MEMORY_SIZE = 100000
+# with a replay store the memory only stages the current episode: a 30 minute
+# game is about 5000 steps at the default game step of 8 loops
+EPISODE_MEMORY_SIZE = 5000
+# act through a compiled single sample forward function instead of predict
+FAST_INFERENCE = True
 
 class DQNModel:
-    def __init__(self, action_space, gamma=0.99, eps=1.0, eps_min=0.01, eps_decay=0.9998):
-        self.memory = deque(maxlen=100000)
+    def __init__(self, action_space, gamma=0.99, eps=1.0, eps_min=0.01, eps_decay=0.9998, 
+                 replay_store=None, prioritized=False, double=False, dueling=False, 
+                 target_tau=None, state_shape=FRAME_SHAPE, memory_size=None):
+        """
+        :param replay_store: <DiskReplayMemory> optional store that episodes 
+        are appended to and replayed from across games.
+        :param prioritized: <bool> sample by TD error priority. The replay 
+        store, if any, must then be a prioritized memory as well.
+        :param double: <bool> Double DQN targets: the online network picks 
+        the next action and the target network values it.
+        :param dueling: <bool> split the network head into state value and 
+        action advantage streams, checkpointed under its own name.
+        :param target_tau: <float> Polyak rate the target network follows 
+        the online one by after every replay. None syncs it fully on each 
+        train_target_model call instead.
+        :param state_shape: <tuple> (height, width, channels) of a uint8 
+        state, RGB frames or feature planes.
+        :param memory_size: <int> transitions the in-memory replay holds. 
+        Defaults to MEMORY_SIZE, or EPISODE_MEMORY_SIZE when it only stages 
+        episodes for a replay store.
+        """
+        self.state_shape = tuple(state_shape)
+        self.prioritized = prioritized
+        self.double = double
+        self.dueling = dueling
+        self.target_tau = target_tau
+        if memory_size is None:
+            memory_size = MEMORY_SIZE if replay_store is None else EPISODE_MEMORY_SIZE
+        if prioritized:
+            self.memory = PrioritizedReplayMemory(memory_size, self.state_shape)
+        else:
+            self.memory = ReplayMemory(memory_size, self.state_shape)
+        self.replay_store = replay_store
         self.gamma = gamma
         self.epsilon = eps
         self.epsilon_min = eps_min
         self.epsilon_decay = eps_decay
+        # decay_epsilon calls so far, also those made at epsilon_min
+        self.decay_steps = 0
 
         self.actions = action_space
         self.num_actions = len(action_space)
 
         self.model = self.build_neural_network_model()
         self.target_model = self.build_neural_network_model(print_summary=False)
+        self._sync_target = self._target_sync_function(1.0)
+        self._soft_sync_target = None
+        if target_tau is not None:
+            self._soft_sync_target = self._target_sync_function(target_tau)
 
-        if LOAD:
-            self.load("training/terran-dqn.h5")
+        # network used to act; an AsyncLearner swaps in a synced copy
+        self.policy_model = self.model
+        self._predictor = None
+
+        # log everything via tensorboard
+        self.tensorboard = TensorBoard(log_dir="log")
+
+        checkpoint = self.checkpoint_name(CHECKPOINT)
+        if LOAD and os.path.exists(checkpoint):
+            try:
+                self.load(CHECKPOINT)
+            except ValueError as err:
+                # e.g. saved for another state shape; train from scratch
+                print(f"not loading {checkpoint}: {err}")
         
-    def build_neural_network_model(self, print_summary=True):
+    def build_neural_network_model(self, print_summary=True, dueling=None):
+        """
+        :param dueling: <bool> build the dueling head; defaults to the 
+        model's own setting, so extra copies match its networks.
+        """
+        if dueling is None:
+            dueling = self.dueling
         model = Sequential()
 
         # hidden conv net layers
         num_layers = [32, 64, 128]
         specify_shape = True
+        size = min(self.state_shape[:2])
         for num_layer in num_layers:
             if specify_shape:
                 model.add(Conv2D(num_layer, 
                                  (3, 3), 
                                  padding='same', 
-                                 input_shape=(184, 152, 3), 
+                                 input_shape=self.state_shape, 
                                  activation='relu'))
                 specify_shape = False
             else:
                 model.add(
                     Conv2D(num_layer, (3, 3), padding='same', activation='relu'))
 
-            model.add(Conv2D(num_layer, (3, 3), activation='relu'))
-            model.add(MaxPooling2D(pool_size=(2, 2)))
+            # small feature planes run out of resolution before the last block
+            if size - 2 >= 2:
+                model.add(Conv2D(num_layer, (3, 3), activation='relu'))
+                model.add(MaxPooling2D(pool_size=(2, 2)))
+                size = (size - 2) // 2
             model.add(Dropout(0.2))
 
         # fully connected dense layer
         model.add(Flatten())
-        model.add(Dense(128, activation='relu'))
-        model.add(Dropout(0.2))
-
-        # output layer
-        model.add(Dense(self.num_actions, activation='softmax'))
 
         # compilation settings
         self.alpha = 1e-4
         opt = keras.optimizers.adam(lr=self.alpha, decay=1e-6)
 
-        model.compile(loss='categorical_crossentropy',
-                           optimizer=opt,
-                           metrics=['accuracy'])
+        if dueling:
+            model = self._dueling_head(model)
+            model.compile(loss='mse', optimizer=opt)
+        else:
+            model.add(Dense(128, activation='relu'))
+            model.add(Dropout(0.2))
+
+            # output layer
+            model.add(Dense(self.num_actions, activation='softmax'))
+
+            model.compile(loss='categorical_crossentropy',
+                               optimizer=opt,
+                               metrics=['accuracy'])
         if print_summary:
             model.summary()
-
-        # log everything via tensorboard
-        self.tensorboard = TensorBoard(log_dir="log")
         return model
 
+    def _dueling_head(self, trunk):
+        """
+        Q(s, a) = V(s) + A(s, a) - mean(A(s)), on top of the conv trunk's 
+        flattened features; outputs are unbounded Q-values.
+        """
+        features = trunk.output
+
+        value = Dense(128, activation='relu')(features)
+        value = Dropout(0.2)(value)
+        value = Dense(1)(value)
+
+        advantage = Dense(128, activation='relu')(features)
+        advantage = Dropout(0.2)(advantage)
+        advantage = Dense(self.num_actions)(advantage)
+
+        q_values = Lambda(lambda streams: streams[0] + streams[1] - 
+                          K.mean(streams[1], axis=1, keepdims=True))([value, advantage])
+        return Model(inputs=trunk.input, outputs=q_values)
+
+    def _target_sync_function(self, tau):
+        """
+        :return: <function> moving every target weight tau of the way 
+        towards the online weight, as one set of in-graph assignments.
+        """
+        updates = []
+        for target, online in zip(self.target_model.weights, self.model.weights):
+            updates.append(K.update(target, online if tau == 1.0 else 
+                                    tau * online + (1.0 - tau) * target))
+        return K.function([], [], updates=updates)
+
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.remember(state, action, reward, next_state, done)
 
     def choose_action(self, state):
         if np.random.rand() <= self.epsilon:
             return np.random.choice(self.num_actions)
         else:
-            action_values = self.model.predict(state)
-            return np.argmax(action_values[0])
+            return np.argmax(self.action_values(state))
+
+    def action_values(self, state):
+        """
+        :return: <np.ndarray> Q-values of one state under the policy network.
+        """
+        if not FAST_INFERENCE:
+            return self.policy_model.predict(state)[0]
+
+        # rebuilt only when an AsyncLearner swaps in its own policy network
+        if self._predictor is None or self._predictor.model is not self.policy_model:
+            self._predictor = Predictor(self.policy_model)
+        return self._predictor(state)
     
-    def replay(self, batch_size):
-        if len(self.memory) <= batch_size:
-            minibatch = self.memory
+    def end_episode(self):
+        """
+        Moves this episode's transitions into the persistent replay store.
+        """
+        if self.replay_store is None:
+            return
+
+        self.replay_store.extend(self.memory)
+        self.replay_store.flush()
+        self.memory.clear()
+
+    def replay(self, batch_size, decay_epsilon=True):
+        # past episodes live in the replay store once it can fill a batch
+        memory = self.memory
+        if self.replay_store is not None and len(self.replay_store) >= batch_size:
+            memory = self.replay_store
+
+        if len(memory) <= batch_size:
+            slots = memory.live_slots()
         else:
-            minibatch = random.sample(self.memory, batch_size)
+            slots = memory.sample_slots(batch_size)
 
-        for state, action, reward, next_state, done in minibatch:
-            target = self.target_model.predict(state)
-            if done:
-                target[0][action] = reward
-            else:
-                q_next = max(self.target_model.predict(next_state)[0])
-                target[0][action] = reward + q_next * self.gamma
-            self.model.fit(state, target, epochs=1, verbose=0)
+        # the whole minibatch costs at most one forward pass per network over
+        # states and next states stacked together, and a single gradient step;
+        # the online pass, needed for Double DQN targets and PER's TD errors,
+        # serves both
+        states, actions, rewards, next_states, dones = memory.gather(slots)
+        size = len(actions)
+        batch = np.arange(size)
+        both = np.concatenate([states, next_states])
+
+        target_q = self.target_model.predict(both, batch_size=2 * size)
+        targets, target_next = target_q[:size], target_q[size:]
+        online_q = None
+        if self.double or self.prioritized:
+            online_q = self.model.predict(both, batch_size=2 * size)
+
+        if self.double:
+            q_next = target_next[batch, np.argmax(online_q[size:], axis=1)]
+        else:
+            q_next = np.max(target_next, axis=1)
+        targets[batch, actions] = \
+            np.where(dones, rewards, rewards + q_next * self.gamma)
 
+        if self.prioritized:
+            weights = memory.importance_weights(slots)
+            q_values = online_q[batch, actions]
+            self.model.train_on_batch(states, targets, sample_weight=weights)
+            memory.update_priorities(slots, targets[batch, actions] - q_values)
+        else:
+            self.model.train_on_batch(states, targets)
+
+        if self._soft_sync_target is not None:
+            self._soft_sync_target([])
+        if decay_epsilon:
+            self.decay_epsilon()
+
+    def decay_epsilon(self, steps=1):
+        """
+        :param steps: <int> decay steps to apply at once, e.g. the ones a 
+        collector worker applied to its own copy during a game.
+        """
+        self.decay_steps += steps
         if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
+            self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay ** steps)
+
+    def checkpoint_name(self, name):
+        """
+        Weights only load into the head type that saved them, so dueling 
+        networks keep their checkpoints next to the plain ones, e.g. 
+        terran-dqn-dueling.h5 for terran-dqn.h5.
+        """
+        if not self.dueling:
+            return name
+        root, ext = os.path.splitext(name)
+        return f"{root}-dueling{ext}"
 
     def load(self, name):
-        self.model.load_weights(name)
+        self.model.load_weights(self.checkpoint_name(name))
 
     def save(self, name):
-        self.model.save_weights(name)
+        self.model.save_weights(self.checkpoint_name(name))
 
     def train_target_model(self):
-        weights = self.model.get_weights()
-        target_weights = self.target_model.get_weights()
-        for i in range(len(target_weights)):
-            target_weights[i] = weights[i]
-        self.target_model.set_weights(target_weights)
+        """
+        Copies the online weights into the target network in place. With 
+        target_tau set the target already follows the online network after 
+        every replay, so periodic full syncs are skipped.
+        """
+        if self.target_tau is None:
+            self._sync_target([])
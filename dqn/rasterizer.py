@@ -0,0 +1,102 @@
+import cv2 as cv
+import numpy as np
+
+# note that colors are in BGR representation
+OWN_COLOR = (0, 0, 255)
+ENEMY_COLOR = (255, 0, 0)
+
+# ring keys are int(radius*8) * MAX_THICKNESS + int(radius*0.5)
+MAX_RADIUS = 256
+MAX_THICKNESS = 16
+
+class StateRasterizer:
+    """
+    Draws the minimap state into a single preallocated frame.
+
+    Frames are written directly in image orientation ((0, 0) top-left), so no
+    flip is needed afterwards. Each distinct (radius, thickness) ring is
+    rasterized once with cv.circle into a table of linear pixel offsets, after
+    which all units of a color are drawn with a single scatter. The frame is a
+    view into a buffer with a blank margin wide enough for any ring, so no per
+    pixel bounds checks are needed.
+    """
+
+    def __init__(self, map_size):
+        self.width, self.height = map_size
+        self.margin = MAX_RADIUS + MAX_THICKNESS + 2
+        self._stride = self.width + 2 * self.margin
+        self._buffer = np.zeros(
+            (self.height + 2 * self.margin, self._stride, 3), np.uint8)
+        self._pixels = self._buffer.reshape(-1, 3)
+        self.frame = self._buffer[self.margin:-self.margin, self.margin:-self.margin]
+
+        # ring i spans [_starts[i], _starts[i] + _lengths[i]) of _offsets
+        self._ring_ids = np.full(MAX_RADIUS * MAX_THICKNESS, -1, np.intp)
+        self._offsets = np.zeros(0, np.intp)
+        self._starts = np.zeros(0, np.intp)
+        self._lengths = np.zeros(0, np.intp)
+
+    def clear(self):
+        self.frame.fill(0)
+
+    def draw_units(self, positions, radii, color):
+        """
+        Draws a ring for every unit, pixel for pixel matching
+        cv.circle(map, posn, int(radius*8), color, int(radius*0.5)) on the
+        unflipped map.
+
+        :param positions: <np.ndarray> (N, 2) game coordinates.
+        :param radii: <np.ndarray> (N,) unit radii.
+        :param color: <tuple> BGR color of the rings.
+        """
+        if len(positions) == 0:
+            return
+
+        keys = np.minimum((radii * 8).astype(np.intp), MAX_RADIUS - 1) * MAX_THICKNESS \
+            + np.minimum((radii * 0.5).astype(np.intp), MAX_THICKNESS - 1)
+        rings = self._ring_ids[keys]
+        if np.any(rings < 0):
+            for key in np.unique(keys[rings < 0]):
+                self._add_ring(key)
+            rings = self._ring_ids[keys]
+
+        cells = positions.astype(np.intp)
+        centers = (self.height - 1 + self.margin - cells[:, 1]) * self._stride \
+            + cells[:, 0] + self.margin
+
+        # expand every unit into the offsets of its ring
+        lengths = self._lengths[rings]
+        ends = np.cumsum(lengths)
+        offsets = np.arange(ends[-1]) + np.repeat(self._starts[rings] - ends + lengths, lengths)
+        self._pixels[np.repeat(centers, lengths) + self._offsets[offsets]] = color
+
+    def draw_bar(self, row, length, color):
+        """
+        Draws a resource bar of the given length starting at the left edge.
+
+        :param row: <int> game y coordinate of the bar.
+        """
+        y = self.height - 1 - row
+        cv.line(self.frame, (0, y), (int(length), y), color, 2)
+
+    def _add_ring(self, key):
+        radius, thickness = divmod(int(key), MAX_THICKNESS)
+        span = radius + thickness + 2
+        canvas = np.zeros((2 * span + 1, 2 * span + 1), np.uint8)
+        cv.circle(canvas, (span, span), radius, 255, thickness)
+        dy, dx = np.nonzero(canvas)
+
+        # the frame is flipped vertically, so vertical offsets are mirrored
+        self._ring_ids[key] = len(self._starts)
+        self._starts = np.append(self._starts, len(self._offsets))
+        self._lengths = np.append(self._lengths, len(dx))
+        self._offsets = np.append(self._offsets, (span - dy) * self._stride + dx - span)
+
+def unit_arrays(units):
+    """
+    Extracts (positions, radii) numpy arrays from an iterable of units.
+    """
+    units = list(units)
+    positions = np.array([unit.position for unit in units], dtype=np.float32)
+    radii = np.array([unit.radius for unit in units], dtype=np.float32)
+    return positions.reshape(-1, 2), radii
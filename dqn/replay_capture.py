@@ -0,0 +1,22 @@
+import repo_root
+import model
+from model import DQNModel
+from shared.observation_capture import replay_into
+from terran_ai import TerranBot, STATE_SHAPE
+
+import sys
+
+def replay(path, start=0, stop=None):
+    """
+    Replays a capture into a fresh TerranBot with an untrained model and
+    inline training off; see observation_capture.replay_into.
+    """
+    model.LOAD = False
+    bot = TerranBot(DQNModel(range(TerranBot.NUM_ACTIONS), state_shape=STATE_SHAPE), 
+                    train=False)
+    replay_into(bot, "TerranBot", path, start, stop)
+
+if __name__ == "__main__":
+    # replay_capture.py <capture> [start] [stop]
+    bounds = [int(arg) for arg in sys.argv[2:4]]
+    replay(sys.argv[1], *bounds)
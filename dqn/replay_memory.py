@@ -0,0 +1,377 @@
+import json
+import os
+
+import numpy as np
+
+FRAME_SHAPE = (184, 152, 3)
+
+class ReplayMemory:
+    """
+    Fixed size experience replay backed by preallocated numpy arrays.
+
+    Frames live in their own ring and every transition refers to its state
+    and next state by frame id, so a frame shared by consecutive transitions
+    is stored exactly once. Ids grow monotonically; the slot of an id is
+    `id % frame_capacity`, which lets us tell evicted frames apart from live ones.
+    """
+
+    def __init__(self, capacity, frame_shape=FRAME_SHAPE, frame_capacity=None):
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self.frame_capacity = frame_capacity or capacity + 1
+
+        self.frames = self._allocate(
+            "frames", (self.frame_capacity,) + self.frame_shape, np.uint8)
+        self.state_ids = self._allocate("state_ids", (capacity,), np.int64)
+        self.next_state_ids = self._allocate("next_state_ids", (capacity,), np.int64)
+        self.actions = self._allocate("actions", (capacity,), np.int32)
+        self.rewards = self._allocate("rewards", (capacity,), np.float32)
+        self.dones = self._allocate("dones", (capacity,), np.bool_)
+
+        # serial numbers of the oldest live and the next transition, and the
+        # id the next frame will be written under
+        self.head = 0
+        self.tail = 0
+        self.frames_written = 0
+        self._last_frame = None
+
+    def _allocate(self, name, shape, dtype):
+        return np.zeros(shape, dtype=dtype)
+
+    def __len__(self):
+        return self.tail - self.head
+
+    @property
+    def nbytes(self):
+        """
+        Exact number of bytes held by the backing arrays.
+        """
+        return sum(array.nbytes for array in (self.frames,
+                                              self.state_ids,
+                                              self.next_state_ids,
+                                              self.actions,
+                                              self.rewards,
+                                              self.dones))
+
+    def remember(self, state, action, reward, next_state, done):
+        state_id = self._store_frame(state)
+        next_state_id = state_id if next_state is state \
+            else self._store_frame(next_state)
+
+        slot = self.tail % self.capacity
+        self.state_ids[slot] = state_id
+        self.next_state_ids[slot] = next_state_id
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.dones[slot] = done
+        self.tail += 1
+        self._evict()
+
+    def _store_frame(self, frame):
+        # the state of a transition is usually the next state of the last one
+        if frame is self._last_frame:
+            return self.frames_written - 1
+
+        frame_id = self.frames_written
+        self.frames[frame_id % self.frame_capacity] = \
+            np.reshape(frame, self.frame_shape)
+        self.frames_written += 1
+        self._last_frame = frame
+        self._evict()
+        return frame_id
+
+    def _evict(self):
+        self.head = max(self.head, self.tail - self.capacity)
+
+        # drop the oldest transitions whose frames have been overwritten
+        oldest_frame = self.frames_written - self.frame_capacity
+        while self.head < self.tail:
+            slot = self.head % self.capacity
+            if min(self.state_ids[slot], self.next_state_ids[slot]) >= oldest_frame:
+                break
+            self.head += 1
+
+    def sample(self, batch_size):
+        """
+        Samples (with replacement) a batch of transitions.
+
+        :param batch_size: <int> number of transitions to draw.
+        :return: <tuple> (states, actions, rewards, next_states, dones) as
+        contiguous arrays with the batch along the first axis.
+        """
+        return self.gather(self.sample_slots(batch_size))
+
+    def sample_slots(self, batch_size):
+        serials = self.head + np.random.randint(len(self), size=batch_size)
+        return serials % self.capacity
+
+    def live_slots(self):
+        return np.arange(self.head, self.tail) % self.capacity
+
+    def gather(self, slots):
+        states = self.frames[self.state_ids[slots] % self.frame_capacity]
+        next_states = self.frames[self.next_state_ids[slots] % self.frame_capacity]
+        return (states,
+                self.actions[slots],
+                self.rewards[slots],
+                next_states,
+                self.dones[slots])
+
+    def clear(self):
+        # rewind rather than skip ahead, so ids restart at 0 for the next episode
+        self.head = 0
+        self.tail = 0
+        self.frames_written = 0
+        self._last_frame = None
+
+    def extend(self, other):
+        """
+        Appends every live transition of another replay memory in bulk.
+
+        :param other: <ReplayMemory> memory to copy transitions from. Its 
+        frame shape must match ours.
+        """
+        if len(other) == 0:
+            return
+
+        states, actions, rewards, next_states, dones = \
+            other.gather_ids(other.live_slots())
+
+        # copy the contiguous run of frames the transitions refer to
+        first_frame = min(states.min(), next_states.min())
+        frame_ids = np.arange(first_frame, other.frames_written)
+        offset = self.frames_written - first_frame
+        self._write_ring(self.frames,
+                         self.frames_written,
+                         other.frames[frame_ids % other.frame_capacity])
+        self.frames_written += len(frame_ids)
+
+        self._write_ring(self.state_ids, self.tail, states + offset)
+        self._write_ring(self.next_state_ids, self.tail, next_states + offset)
+        self._write_ring(self.actions, self.tail, actions)
+        self._write_ring(self.rewards, self.tail, rewards)
+        self._write_ring(self.dones, self.tail, dones)
+        self.tail += len(actions)
+
+        self._last_frame = None
+        self._evict()
+
+    def save(self, file):
+        """
+        Writes the live transitions and the frames they use to an .npz file.
+        """
+        states, actions, rewards, next_states, dones = self.gather_ids(self.live_slots())
+        first_frame = min(states.min(), next_states.min()) if len(actions) else 0
+        frame_ids = np.arange(first_frame, self.frames_written)
+
+        np.savez(file,
+                 frames=self.frames[frame_ids % self.frame_capacity],
+                 state_ids=states - first_frame,
+                 next_state_ids=next_states - first_frame,
+                 actions=actions,
+                 rewards=rewards,
+                 dones=dones)
+
+    def gather_ids(self, slots):
+        """
+        Like gather, but returns frame ids in place of the frames themselves.
+        """
+        return (self.state_ids[slots],
+                self.actions[slots],
+                self.rewards[slots],
+                self.next_state_ids[slots],
+                self.dones[slots])
+
+    @staticmethod
+    def _write_ring(array, serial, values):
+        # keep only what fits, then write in at most two contiguous slices
+        dropped = max(0, len(values) - len(array))
+        values = values[dropped:]
+        start = (serial + dropped) % len(array)
+        split = min(len(values), len(array) - start)
+        array[start:start + split] = values[:split]
+        array[:len(values) - split] = values[split:]
+
+def load_episode(file):
+    """
+    Reads transitions written by ReplayMemory.save into an exactly sized
+    ReplayMemory, e.g. to extend a replay store with them.
+    """
+    with np.load(file) as data:
+        frames = data["frames"]
+        memory = ReplayMemory(max(1, len(data["actions"])),
+                              frame_shape=frames.shape[1:],
+                              frame_capacity=max(1, len(frames)))
+        memory.frames[:len(frames)] = frames
+        memory.frames_written = len(frames)
+        for name in ("state_ids", "next_state_ids", "actions", "rewards", "dones"):
+            getattr(memory, name)[:len(data[name])] = data[name]
+        memory.tail = len(data["actions"])
+    return memory
+
+class DiskReplayMemory(ReplayMemory):
+    """
+    Replay memory whose arrays are memory mapped .npy files in a directory, 
+    so transitions persist across episodes and process restarts while 
+    sampling only pages in the frames it touches.
+    """
+
+    def __init__(self, path, capacity, frame_shape=FRAME_SHAPE, frame_capacity=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        super().__init__(capacity, frame_shape, frame_capacity)
+
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as meta:
+                counters = json.load(meta)
+            self.head = counters["head"]
+            self.tail = counters["tail"]
+            self.frames_written = counters["frames_written"]
+
+    def _allocate(self, name, shape, dtype):
+        file = os.path.join(self.path, f"{name}.npy")
+        if not os.path.exists(file):
+            return np.lib.format.open_memmap(file, mode="w+", dtype=dtype, shape=shape)
+
+        array = np.lib.format.open_memmap(file, mode="r+")
+        if array.shape != shape or array.dtype != dtype:
+            raise ValueError(f"{file} holds {array.dtype}{array.shape}, "
+                             f"expected {np.dtype(dtype)}{shape}")
+        return array
+
+    def sample_slots(self, batch_size):
+        # sorted slots read the mapped files front to back
+        return np.sort(super().sample_slots(batch_size))
+
+    def flush(self):
+        for array in (self.frames,
+                      self.state_ids,
+                      self.next_state_ids,
+                      self.actions,
+                      self.rewards,
+                      self.dones):
+            array.flush()
+
+        with open(os.path.join(self.path, "meta.json"), "w") as meta:
+            json.dump({
+                "head": self.head,
+                "tail": self.tail,
+                "frames_written": self.frames_written
+            }, meta)
+
+class SumTree:
+    """
+    Binary tree whose internal nodes hold the sum of their children, giving 
+    O(log n) priority updates and prefix-sum lookups. All operations work on 
+    whole batches of leaves at once.
+    """
+
+    def __init__(self, capacity):
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.tree = np.zeros(2 * self.leaves, np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, slots):
+        return self.tree[self.leaves + slots]
+
+    def update(self, slots, priorities):
+        nodes = self.leaves + np.asarray(slots)
+        self.tree[nodes] = priorities
+
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """
+        Returns, for each value, the leaf whose prefix-sum range contains it.
+        """
+        values = np.minimum(values, np.nextafter(self.total, 0))
+        nodes = np.ones(len(values), np.intp)
+        while nodes[0] < self.leaves:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = values - self.tree[left] * go_right
+            nodes = left + go_right
+        return nodes - self.leaves
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """
+    Replay memory that samples transitions proportionally to their priority.
+
+    New transitions enter with the highest priority seen so far, so rare ones
+    like the end of game reward are replayed at least once; priorities are 
+    then updated from TD errors after each training step. Importance sampling
+    weights correct for the non-uniform sampling, with beta annealed to 1.
+    """
+
+    def __init__(self, *args, alpha=0.6, beta=0.4, beta_increment=1e-4, eps=1e-3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.eps = eps
+
+        self.priorities = SumTree(self.capacity)
+        self.max_priority = 1.0
+        if len(self) > 0:
+            self.priorities.update(self.live_slots(), self.max_priority)
+
+    def remember(self, state, action, reward, next_state, done):
+        head, tail = self.head, self.tail
+        super().remember(state, action, reward, next_state, done)
+        self._sync_priorities(head, tail)
+
+    def extend(self, other):
+        head, tail = self.head, self.tail
+        super().extend(other)
+        self._sync_priorities(head, tail)
+
+    def clear(self):
+        # the slots are reused from 0 on, so zero them all before rewinding
+        if len(self) > 0:
+            self.priorities.update(self.live_slots(), 0.0)
+        super().clear()
+
+    def _sync_priorities(self, head, tail):
+        # zero out evicted transitions, then add new ones at max priority
+        evicted = np.arange(head, min(self.head, tail)) % self.capacity
+        if len(evicted) > 0:
+            self.priorities.update(evicted, 0.0)
+
+        added = np.arange(max(tail, self.head), self.tail) % self.capacity
+        if len(added) > 0:
+            self.priorities.update(added, self.max_priority)
+
+    def sample_slots(self, batch_size):
+        # stratified: one draw from each of batch_size equal priority segments
+        segment = self.priorities.total / batch_size
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * segment
+        return self.priorities.find(values)
+
+    def importance_weights(self, slots):
+        """
+        Importance sampling weights of sampled slots, normalized to a max of 1.
+        """
+        probabilities = self.priorities[slots] / self.priorities.total
+        weights = (len(self) * probabilities) ** -self.beta
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, slots, td_errors):
+        priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+        self.priorities.update(slots, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+class PrioritizedDiskReplayMemory(PrioritizedReplayMemory, DiskReplayMemory):
+    """
+    Prioritized replay over the on-disk store. Priorities are kept in memory
+    only; transitions loaded from disk start at max priority.
+    """
@@ -1,65 +1,144 @@
+import repo_root
 import sc2
 from sc2 import BotAI, Race, Difficulty, Result, position
 from sc2.constants import *
 from sc2.helpers import ControlGroup
 from sc2.player import Bot, Computer
 
-from model import DQNModel
+from model import DQNModel, EPISODE_MEMORY_SIZE
+from replay_memory import DiskReplayMemory, PrioritizedDiskReplayMemory, load_episode, FRAME_SHAPE
+from collector import Collector
+from learner import AsyncLearner
+from rasterizer import StateRasterizer, unit_arrays, OWN_COLOR, ENEMY_COLOR
+from shared.feature_planes import FeaturePlaneEncoder, unit_positions
+from decision_scheduler import DecisionScheduler
+from shared.profiler import make_profiler
+from shared.command_batcher import CommandBatcher, flushes_commands
+from shared.unit_selections import UnitSelections
+from shared.spatial_index import StepIndices
+from shared.map_analysis import MapAnalysis
+from shared.metrics_log import MetricsLog
+from shared.observation_capture import ObservationCapture
 
 import cv2 as cv
 import numpy as np
 import keras
 
-import math
+import os
 import random
 from time import time
 
 TIME_SCALAR = 22.4
 SECONDS_PER_MIN = 60
 NUM_EPISODES = 1000
+# episode i is seeded with SEED + i; set it to a logged seed to replay a run
+SEED = int(time())
 TRAIN_DIR = "training"
 VISUALIZE = False
+# states as downsampled uint8 feature planes instead of drawn RGB frames
+FEATURE_PLANES = False
+MAP_SIZE = (FRAME_SHAPE[1], FRAME_SHAPE[0])
+STATE_SHAPE = FeaturePlaneEncoder(MAP_SIZE).shape if FEATURE_PLANES else FRAME_SHAPE
 REPLAY_BATCH_SIZE = 80
 UPDATE_TARGET_FREQ = 1000
+# most async learner train steps per transition the game loop pushes
+REPLAY_RATIO = 4
+# game loops between decisions (observe, infer, remember); skipped steps 
+# repeat the last action and add their reward to its transition
+FRAME_SKIP = 32
+ACTION_REPEAT = True
+REPLAY_STORE_SIZE = 1000000
+CHECKPOINT_FREQ = 10
+PRIORITIZED_REPLAY = True
+# Double DQN targets, a dueling network head and, when set, a Polyak rate 
+# for the target network in place of syncing it every UPDATE_TARGET_FREQ
+DOUBLE_DQN = False
+DUELING = False
+TARGET_TAU = None
+ASYNC_LEARNER = True
+# games played in parallel worker processes; 1 plays them in this process
+NUM_COLLECTORS = 1
+TRAIN_STEPS_PER_EPISODE = 200
+POLICY_FILE = f"{TRAIN_DIR}/terran-dqn-policy.h5"
+# per-phase on_step latency histograms, summarized into PROFILE_LOG per game
+PROFILE = False
+PROFILE_LOG = "profile.log"
+# one fixed-schema record per episode; read it with metrics_log.read_metrics
+METRICS_LOG = f"{TRAIN_DIR}/metrics.bin"
+# when set, every observation of an episode is captured to 
+# CAPTURE_DIR/episode-<n>.obs.gz for replay with ObservationReplay
+CAPTURE_DIR = None
+# on_step phases with their own column in the metrics log
+PHASES = [
+    "remember", "sync_policy", "replay", "train_target_model", "visualize", 
+    "last_stand", "research_and_defend", "choose_action", "dispatch_waves", 
+    "distribute_workers", "lower_depots"
+]
+
+DEPOT_TYPES = [SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP]
+MILITARY_TYPES = [MARINE, MARAUDER, MEDIVAC, HELLION]
 
 class TerranBot(sc2.BotAI):
 
-    def __init__(self, epsilon=1.0):
+    # <dict> [str: int] action method names mapped to their selection weight.
+    WEIGHTED_ACTIONS = {
+        "no_op": 1,
+        "standby": 1,
+        "attack": 3,
+        "manage_supply": 5,
+        "adjust_refinery_assignment": 1,
+        "manage_refineries": 1,
+        "manage_barracks": 3,
+        "manage_barracks_tech_labs": 1,
+        "manage_barracks_reactors": 1,
+        "manage_factories": 1,
+        "manage_starports": 1,
+        "train_workers": 3,
+        "train_marines": 7,
+        "train_marauders": 4,
+        "train_hellions": 1,
+        "train_medivacs": 1,
+        "upgrade_cc": 1,
+        "expand": 4,
+        "scout": 1,
+        "calldown_mules": 2,
+    }
+    NUM_ACTIONS = sum(WEIGHTED_ACTIONS.values())
+
+    def __init__(self, dqn, learner=None, train=True, capture=None):
+        """
+        :param dqn: <DQNModel> agent shared across episodes; the bot only 
+        acts and records transitions through it.
+        :param learner: <AsyncLearner> optional background learner. When 
+        given, transitions are queued to it and the bot never trains inline.
+        :param train: <bool> replay inline. Collector workers only act and 
+        record, leaving training to the central trainer.
+        :param capture: <ObservationCapture> optional sink for every 
+        observation the bot sees.
+        """
+        self.capture = capture
+        self.learner = learner
+        self.train = train
         self.next_actionable = 0
+        self.scheduler = DecisionScheduler(FRAME_SKIP, ACTION_REPEAT)
         self.scout_locations = {}
         self.rewards = []
 
-        weighted_actions = {
-            self.no_op: 1,
-            self.standby: 1,
-            self.attack: 3,
-            self.manage_supply: 5,
-            self.adjust_refinery_assignment: 1,
-            self.manage_refineries: 1,
-            self.manage_barracks: 3,
-            self.manage_barracks_tech_labs: 1,
-            self.manage_barracks_reactors: 1,
-            self.manage_factories: 1,
-            self.manage_starports: 1,
-            self.train_workers: 3,
-            self.train_marines: 7,
-            self.train_marauders: 4,
-            self.train_hellions: 1,
-            self.train_medivacs: 1,
-            self.upgrade_cc: 1,
-            self.expand: 4,
-            self.scout: 1,
-            self.calldown_mules: 2,
-        }
-
         self.actions = []
-        for action_fn, weight in weighted_actions.items():
+        for action_name, weight in self.WEIGHTED_ACTIONS.items():
             for _ in range(weight):
-                self.actions.append(action_fn)
+                self.actions.append(getattr(self, action_name))
 
         self.curr_state = None
+        self.rasterizer = None
+        self.encoder = None
+        self.profiler = make_profiler(PROFILE)
+        self.commands = CommandBatcher(self)
+        self.selections = UnitSelections()
+        self.spatial = StepIndices(self)
+        self.map_analysis = None
         self.num_actions = len(self.actions)
-        self.dqn = DQNModel(self.actions, eps=epsilon)
+        self.dqn = dqn
 
         self.iteration = 0
 
@@ -77,30 +156,87 @@ class TerranBot(sc2.BotAI):
             BARRACKSTECHLABRESEARCH_STIMPACK
         ]
 
+    @flushes_commands
     async def on_step(self, iteration):
+        if self.capture is not None:
+            self.capture.record(self, iteration)
+        self.selections.reset(self.units)
+        self.spatial.reset()
+        if self.map_analysis is None:
+            self.map_analysis = MapAnalysis.load(self)
         self.seconds_elapsed = self.state.game_loop / TIME_SCALAR
         self.minutes_elapsed = self.seconds_elapsed / SECONDS_PER_MIN
         self.attack_waves = set()
         self.iteration += 1
         self.num_troops_per_wave = min(14 + self.minutes_elapsed, 30)
 
+        profiler = self.profiler
+        scheduler = self.scheduler
+        # every step's reward goes to the transition of the last decision
         if self.curr_state is not None:
-            self.prev_state = self.curr_state
-            self.remember()
-            if self.iteration % REPLAY_BATCH_SIZE == 0:
-                self.dqn.replay(REPLAY_BATCH_SIZE)
-            if self.iteration % UPDATE_TARGET_FREQ == 0:
-                self.dqn.train_target_model()
+            scheduler.accumulate(self.step_reward())
+        decide = scheduler.due(self.state.game_loop, self.seconds_elapsed > self.next_actionable)
 
-        await self.visualize()
+        if decide:
+            self.prev_state = self.curr_state
+            with profiler.phase("visualize"):
+                self.visualize()
+
+        if decide and self.prev_state is not None:
+            with profiler.phase("remember"):
+                self.remember(scheduler.take_reward())
+            if self.learner is not None:
+                with profiler.phase("sync_policy"):
+                    self.learner.sync_policy()
+
+            # training keeps pace with transitions, not game steps
+            if self.learner is None and self.train:
+                if scheduler.decisions % REPLAY_BATCH_SIZE == 0:
+                    with profiler.phase("replay"):
+                        self.dqn.replay(REPLAY_BATCH_SIZE)
+                if scheduler.decisions % UPDATE_TARGET_FREQ == 0:
+                    with profiler.phase("train_target_model"):
+                        self.dqn.train_target_model()
+            elif scheduler.decisions % REPLAY_BATCH_SIZE == 0:
+                self.dqn.decay_epsilon()
+
+        # choose on every decision, last stand included, so the next 
+        # transition is remembered with the action chosen for this state
+        if decide:
+            with profiler.phase("choose_action"):
+                self.action = self.make_action_selection()
 
         if not self.townhalls.exists:
             target = self.known_enemy_structures.random_or(self.enemy_start_locations[0]).position
-            for unit in self.workers | self.military_units:
-                await self.do(unit.attack(target))
+            with profiler.phase("last_stand"):
+                for unit in self.workers | self.military_units:
+                    await self.do(unit.attack(target))
             return
 
-        ready_techlabs = self.units(BARRACKSTECHLAB).ready
+        with profiler.phase("research_and_defend"):
+            await self.research_and_defend()
+
+        # print(f"action chosen == {self.action}")
+        with profiler.phase("dispatch_waves"):
+            self.prepare_attack()
+            if len(list(self.attack_waves)) > 0 and self.selections.idle(MEDIVAC).amount > 0:
+                alive_units = list(self.attack_waves)[0].select_units(self.units)
+                for med in self.selections.idle(MEDIVAC):
+                    await self.do(med.attack(alive_units.first.position))
+
+        with profiler.phase("distribute_workers"):
+            await self.distribute_workers()
+        with profiler.phase("lower_depots"):
+            await self.lower_depots()
+        if decide or scheduler.repeat_action:
+            await self.take_action()
+
+    async def research_and_defend(self):
+        """
+        Researches tech lab upgrades and pulls the army back to any base 
+        under attack.
+        """
+        ready_techlabs = self.selections.ready(BARRACKSTECHLAB)
         if len(ready_techlabs) != self.tl_tags:
             self.tl_tags = []
             for techlab in ready_techlabs:
@@ -118,26 +254,18 @@ class TerranBot(sc2.BotAI):
                     pass
 
         for cc in self.townhalls:
-            enemies = self.known_enemy_units.closer_than(25.0, cc).filter(
-                lambda x: x.name.lower() not in ["scv", "drone", "probe"])
+            enemies = self.spatial.threats.closer_than(25.0, cc)
             if len(enemies) > 0:
                 target = random.choice(enemies)
                 for unit in self.military_units:
                     await self.do(unit.attack(target))
                 break
 
-        self.action = self.make_action_selection()
-
-        # print(f"action chosen == {self.action}")
-        self.prepare_attack()
-        if len(list(self.attack_waves)) > 0 and self.units(MEDIVAC).idle.amount > 0:
-            alive_units = list(self.attack_waves)[0].select_units(self.units)
-            for med in self.units(MEDIVAC).idle:
-                await self.do(med.attack(alive_units.first.position))
-
-        await self.distribute_workers()
-        await self.lower_depots()
-        await self.take_action()
+    async def do(self, action):
+        """
+        Queues the command on the step's batch instead of sending it now.
+        """
+        return self.commands.queue(action)
 
     async def no_op(self):
         pass
@@ -149,8 +277,10 @@ class TerranBot(sc2.BotAI):
         if self.seconds_elapsed <= self.next_actionable:
             return
 
+        action = self.actions[self.action]
         try:
-            await self.actions[self.action]()
+            with self.profiler.phase(f"action.{action.__name__}"):
+                await action()
         except Exception as err:
             print(str(err))
 
@@ -160,10 +290,26 @@ class TerranBot(sc2.BotAI):
 
         return self.dqn.choose_action(self.curr_state)
 
+    def step_reward(self):
+        return self.state.score.score / (200 * self.seconds_elapsed)
+
     def remember(self, reward=None, done=False):
-        reward_value = reward if reward else (self.state.score.score / (200 * self.seconds_elapsed))
+        """
+        Stores the transition from the previous decision's state to the 
+        current one, under the action chosen in it. The final transition 
+        (done) leaves the current state instead, and also carries the reward 
+        of the steps since the last decision.
+        """
+        reward_value = reward if reward is not None else self.step_reward()
+        state = self.prev_state
+        if done:
+            reward_value += self.scheduler.take_reward()
+            state = self.curr_state
         self.rewards.append(reward_value)
-        self.dqn.remember(self.prev_state, self.action, reward_value, self.curr_state, done)
+        if self.learner is not None:
+            self.learner.push(state, self.action, reward_value, self.curr_state, done)
+        else:
+            self.dqn.remember(state, self.action, reward_value, self.curr_state, done)
 
     #### WORKERS ####
     #################
@@ -179,22 +325,22 @@ class TerranBot(sc2.BotAI):
     async def manage_supply(self):
         if self.can_afford(SUPPLYDEPOT) \
         and self.supply_left < 10 and self.already_pending(SUPPLYDEPOT) < 2:
-            position = self.townhalls.ready.random.position.towards(
-                self.game_info.map_center, 5)
+            position = self.map_analysis.depot_position(
+                self.townhalls.ready.random.position, self.game_info.map_center)
             await self.build(SUPPLYDEPOT, position)
 
     async def lower_depots(self):
-        for sd in self.units(SUPPLYDEPOT).ready:
+        for sd in self.selections.ready(SUPPLYDEPOT):
             await self.do(sd(MORPH_SUPPLYDEPOT_LOWER))
 
     async def upgrade_cc(self):
-        for cc in self.units(COMMANDCENTER).idle:
-            if self.barracks.ready.exists and self.can_afford(ORBITALCOMMAND):
+        for cc in self.selections.idle(COMMANDCENTER):
+            if self.selections.ready(BARRACKS).exists and self.can_afford(ORBITALCOMMAND):
                 await self.do(cc(UPGRADETOORBITAL_ORBITALCOMMAND))
 
     async def calldown_mules(self):
-        for oc in self.units(ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
-            mfs = self.state.mineral_field.closer_than(10, oc)
+        for oc in self.selections(ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
+            mfs = self.spatial.minerals.closer_than(10, oc)
             if mfs:
                 mf = max(mfs, key=lambda x: x.mineral_contents)
                 await self.do(oc(CALLDOWNMULE_CALLDOWNMULE, mf))
@@ -202,24 +348,25 @@ class TerranBot(sc2.BotAI):
     async def expand(self):
         try:
             if self.can_afford(COMMANDCENTER):
-                await self.expand_now(max_distance=100)
+                location = self.map_analysis.next_expansion(self.townhalls)
+                await self.expand_now(max_distance=100, location=location)
         except Exception as err:
             print(str(err))
 
     async def manage_refineries(self):
-        for cc in self.units(COMMANDCENTER).ready:
-            vgs = self.state.vespene_geyser.closer_than(16.0, cc)
+        for cc in self.selections.ready(COMMANDCENTER):
+            vgs = self.spatial.geysers.closer_than(16.0, cc)
             for vg in vgs:
                 if not self.can_afford(REFINERY):
                     break
                 worker = self.select_build_worker(vg.position)
                 if worker is None:
                     break
-                if not self.units(REFINERY).closer_than(2.0, vg).exists:
+                if not self.selections(REFINERY).closer_than(2.0, vg).exists:
                     await self.do(worker.build(REFINERY, vg))
 
     async def adjust_refinery_assignment(self):
-        r = self.units(REFINERY).ready.random
+        r = self.selections.ready(REFINERY).random
         if r.assigned_harvesters < r.ideal_harvesters:
             w = self.workers.closer_than(16.0, r)
             if w.exists:
@@ -237,7 +384,7 @@ class TerranBot(sc2.BotAI):
         if len(self.known_enemy_structures) > 0:
             target = random.choice(self.known_enemy_structures).position
         elif len(self.known_enemy_units) > 0:
-            target = self.known_enemy_units.closest_to(random.choice(self.townhalls)).position
+            target = self.spatial.enemies.closest_to(random.choice(self.townhalls)).position
         else:
             target = self.enemy_start_locations[0].position
 
@@ -250,65 +397,65 @@ class TerranBot(sc2.BotAI):
                 self.attack_waves.remove(wave)
 
     async def manage_barracks(self): 
-        if not self.depots.ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return
 
         if self.can_afford(BARRACKS) and self.barracks.amount < 1 + self.minutes_elapsed:
-            depot = self.depots.ready.random
+            depot = self.selections.ready(DEPOT_TYPES).random
             await self.build(BARRACKS, near=depot)
 
     async def manage_barracks_tech_labs(self):
-        rax = self.barracks.ready.noqueue.random
+        rax = self.selections.ready_noqueue(BARRACKS).random
         if rax.add_on_tag == 0:
             await self.do(rax.build(BARRACKSTECHLAB))
 
     async def manage_barracks_reactors(self):
-        rax = self.barracks.ready.noqueue.random
+        rax = self.selections.ready_noqueue(BARRACKS).random
         if rax.add_on_tag == 0:
             await self.do(rax.build(BARRACKSREACTOR))
 
     async def manage_factories(self): 
-        if not self.depots.ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return
-        if not self.barracks.ready.exists:
+        if not self.selections.ready(BARRACKS).exists:
             return
 
-        if self.can_afford(FACTORY) and self.units(FACTORY).amount < 3:
-            depot = self.depots.ready.random
+        if self.can_afford(FACTORY) and self.selections(FACTORY).amount < 3:
+            depot = self.selections.ready(DEPOT_TYPES).random
             await self.build(FACTORY, near=depot)
 
     async def manage_starports(self): 
-        if not self.depots.ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return
-        if not self.barracks.ready.exists:
+        if not self.selections.ready(BARRACKS).exists:
             return
-        if not self.units(FACTORY).ready.exists:
+        if not self.selections.ready(FACTORY).exists:
             return
 
-        if self.can_afford(STARPORT) and self.units(STARPORT).amount < 2:
-            depot = self.depots.ready.random
+        if self.can_afford(STARPORT) and self.selections(STARPORT).amount < 2:
+            depot = self.selections.ready(DEPOT_TYPES).random
             await self.build(STARPORT, near=depot)
 
     async def train_marines(self):
-        for rax in self.barracks.ready.filter(lambda x: x.add_on_tag not in self.tl_tags and len(x.orders) < 3):
+        for rax in self.selections.ready(BARRACKS).filter(lambda x: x.add_on_tag not in self.tl_tags and len(x.orders) < 3):
             if not self.can_afford(MARINE):
                 break
             await self.do(rax.train(MARINE))
 
     async def train_marauders(self):
-        for rax in self.barracks.ready.filter(lambda x: x.add_on_tag in self.tl_tags and len(x.orders) < 3):
+        for rax in self.selections.ready(BARRACKS).filter(lambda x: x.add_on_tag in self.tl_tags and len(x.orders) < 3):
             if not self.can_afford(MARAUDER):
                 break
             await self.do(rax.train(MARAUDER))
 
     async def train_hellions(self):
-        for f in self.units(FACTORY).ready.filter(lambda x: len(x.orders) < 3):
+        for f in self.selections.ready(FACTORY).filter(lambda x: len(x.orders) < 3):
             if not self.can_afford(HELLION):
                 break
             await self.do(f.train(HELLION))
 
     async def train_medivacs(self):
-        for sp in self.units(STARPORT).ready.filter(lambda x: len(x.orders) < 3):
+        for sp in self.selections.ready(STARPORT).filter(lambda x: len(x.orders) < 3):
             if not self.can_afford(MEDIVAC):
                 break
             await self.do(sp.train(MEDIVAC))
@@ -319,76 +466,98 @@ class TerranBot(sc2.BotAI):
         """
         total = 0
         for unit in self.military_distribution:
-            units = self.units(unit)
-            total += units.idle.amount
+            total += self.selections.idle(unit).amount
 
         if total >= self.num_troops_per_wave:
             attack_wave = None
 
             for unit in self.military_distribution:
-                units = self.units(unit)
+                idle = self.selections.idle(unit)
 
                 if attack_wave is None:
-                    attack_wave = ControlGroup(units.idle)
+                    attack_wave = ControlGroup(idle)
                 else:
-                    attack_wave.add_units(units.idle)
+                    attack_wave.add_units(idle)
 
             self.attack_waves.add(attack_wave)
 
     #### VISUALIZATION ####
     #######################
 
-    async def visualize(self):
-        game_map = np.zeros((self.game_info.map_size[1], self.game_info.map_size[0], 3), np.uint8)
-        await self.visualize_map(game_map)
-        await self.visualize_resources(game_map)
-
-        # cv assumes (0, 0) top-left => need to flip along horizontal axis
-        curr_state = cv.flip(game_map, 0)
+    def visualize(self):
+        if FEATURE_PLANES:
+            curr_state = self.encode_planes()
+            scale = 2 * self.encoder.downsample
+        else:
+            # frames are drawn straight into a reused buffer in image orientation
+            if self.rasterizer is None:
+                self.rasterizer = StateRasterizer(self.game_info.map_size)
+            self.rasterizer.clear()
+            self.visualize_map()
+            self.visualize_resources()
+            curr_state = self.rasterizer.frame
+            scale = 2
 
         if VISUALIZE:
-            cv.imshow('Map', cv.resize(curr_state, dsize=None, fx=2, fy=2))
+            # the first three planes are shown as color channels
+            cv.imshow('Map', cv.resize(np.ascontiguousarray(curr_state[..., :3]), 
+                                       dsize=None, fx=scale, fy=scale, 
+                                       interpolation=cv.INTER_NEAREST))
             cv.waitKey(1)
-        self.curr_state = curr_state.reshape([-1, 184, 152, 3])
 
-    async def visualize_map(self, game_map):
-        # game coordinates need to be represented as (y, x) in 2d arrays
+        # replay memory keeps a reference to the previous state, so snapshot
+        self.curr_state = curr_state[np.newaxis].copy()
 
-        for unit in self.units().ready:
-            posn = unit.position
-            cv.circle(game_map, (int(posn[0]), int(posn[1])), int(unit.radius*8), (0, 0, 255), math.ceil(int(unit.radius*0.5)))
+    def visualize_map(self):
+        positions, radii = unit_arrays(self.units.ready)
+        self.rasterizer.draw_units(positions, radii, OWN_COLOR)
 
-        for unit in self.known_enemy_units:
-            posn = unit.position
-            cv.circle(game_map, (int(posn[0]), int(posn[1])), int(unit.radius*8), (255, 0, 0), math.ceil(int(unit.radius*0.5)))
+        positions, radii = unit_arrays(self.known_enemy_units)
+        self.rasterizer.draw_units(positions, radii, ENEMY_COLOR)
 
-    async def visualize_resources(self, game_map):
-        line_scalar = 40
+    def encode_planes(self):
+        """
+        :return: <np.ndarray> the state as feature planes, in the order of 
+        feature_planes.SPATIAL_PLANES and SCALAR_PLANES.
+        """
+        if self.encoder is None:
+            self.encoder = FeaturePlaneEncoder(self.game_info.map_size)
+        own = self.units.ready
+        enemies = self.known_enemy_units
+        resources = self.state.mineral_field | self.state.vespene_geyser
+        return self.encoder.encode(
+            [unit_positions(group) for group in [own.not_structure, own.structure, 
+                                                 enemies.not_structure, enemies.structure, 
+                                                 resources]],
+            self.resource_levels())
+
+    def resource_levels(self):
+        """
+        :return: <tuple> minerals, vespene, free supply, supply cap and 
+        military share of used supply, each scaled to [0, 1].
+        """
         minerals = min(1.0, self.minerals / 1200)
         vespene = min(1.0, self.vespene / 1200)
         pop_space = min(1.0, self.supply_left / max(1.0, self.supply_cap))
         supply_usage = self.supply_cap / 200
         military = (self.supply_cap - self.supply_left - self.workers.amount) \
         / max(1, self.supply_cap - self.supply_left)
+        return minerals, vespene, pop_space, supply_usage, military
 
+    def visualize_resources(self):
+        line_scalar = 40
+        minerals, vespene, pop_space, supply_usage, military = self.resource_levels()
 
-        cv.line(game_map, (0, 16), (int(line_scalar*minerals), 16), (255, 40, 37), 2)  
-        cv.line(game_map, (0, 12), (int(line_scalar*vespene), 12), (25, 240, 20), 2)
-        cv.line(game_map, (0, 8),  (int(line_scalar*pop_space), 8), (150, 150, 150), 2)
-        cv.line(game_map, (0, 4),  (int(line_scalar*supply_usage), 4), (64, 64, 64), 2)
-        cv.line(game_map, (0, 0),  (int(line_scalar*military), 0), (0, 0, 255), 2)
+        self.rasterizer.draw_bar(16, line_scalar*minerals, (255, 40, 37))
+        self.rasterizer.draw_bar(12, line_scalar*vespene, (25, 240, 20))
+        self.rasterizer.draw_bar(8, line_scalar*pop_space, (150, 150, 150))
+        self.rasterizer.draw_bar(4, line_scalar*supply_usage, (64, 64, 64))
+        self.rasterizer.draw_bar(0, line_scalar*military, (0, 0, 255))
 
     #### SCOUTING ####
     ##################
 
     async def scout(self):
-        expand_distances = {}
-
-        for el in self.expansion_locations:
-            distance_to_enemy_start = el.distance_to(self.enemy_start_locations[0])
-            expand_distances[distance_to_enemy_start] = el
-
-        distance_keys = sorted(k for k in expand_distances)
         unit_tags = [unit.tag for unit in self.units]
 
         to_be_removed = []
@@ -409,17 +578,12 @@ class TerranBot(sc2.BotAI):
             workers = self.workers.idle if len(self.workers.idle) > 0 else self.workers.gathering
             for worker in workers[:1]:
                 if worker.tag not in self.scout_locations:
-                    for dist in distance_keys:
-                        try:
-                            location = next(v for k, v in expand_distances.items() if k == dist)
-                            active_locations = [self.scout_locations[k] for k in self.scout_locations]
-
-                            if location not in active_locations:
-                                await self.do(worker.move(location))
-                                self.scout_locations[worker.tag] = location
-                                break
-                        except Exception as e:
-                            pass
+                    active_locations = set(self.scout_locations.values())
+                    for location in self.map_analysis.scout_route:
+                        if location not in active_locations:
+                            await self.do(worker.move(location))
+                            self.scout_locations[worker.tag] = location
+                            break
 
         for worker in self.workers:
             if worker.tag in self.scout_locations:
@@ -439,59 +603,218 @@ class TerranBot(sc2.BotAI):
 
     @property
     def depots(self):
-        return self.units.of_type([
-            SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-            ])
+        return self.selections(DEPOT_TYPES)
 
     @property
     def barracks(self):
-        return self.units(BARRACKS)
+        return self.selections(BARRACKS)
 
     @property
     def military_units(self):
-        return self.marines | self.marauders | self.medivacs | self.hellions
+        return self.selections(MILITARY_TYPES)
     
     @property
     def marines(self):
-        return self.units(MARINE)
+        return self.selections(MARINE)
 
     @property
     def marauders(self):
-        return self.units(MARAUDER)
+        return self.selections(MARAUDER)
 
     @property
     def medivacs(self):
-        return self.units(MEDIVAC)
+        return self.selections(MEDIVAC)
 
     @property
     def hellions(self):
-        return self.units(HELLION)
-
-epsilon = 1.0
-gamma = 0.99
-try:
+        return self.selections(HELLION)
+
+def episode_return(rewards, gamma=0.99):
+    reward = 0
+    for idx, r in enumerate(reversed(rewards)):
+        reward += gamma**idx + r
+    return reward
+
+# a collector worker builds its acting model once and reuses it every game
+worker_dqn = None
+
+def play_episode(episode, seed, epsilon):
+    """
+    Collector worker entry point: plays one game with the latest published 
+    policy and writes its transitions to an .npz file for the trainer.
+
+    :return: <tuple> (episode, result, reward, epsilon decay steps applied, 
+    transitions file, metrics fields).
+    """
+    global worker_dqn
+    random.seed(seed)
+    np.random.seed(seed)
+
+    if worker_dqn is None:
+        worker_dqn = DQNModel(range(TerranBot.NUM_ACTIONS), dueling=DUELING, 
+                              state_shape=STATE_SHAPE, 
+                              memory_size=EPISODE_MEMORY_SIZE)
+    if os.path.exists(worker_dqn.checkpoint_name(POLICY_FILE)):
+        worker_dqn.load(POLICY_FILE)
+    worker_dqn.epsilon = epsilon
+    decay_steps = worker_dqn.decay_steps
+    worker_dqn.memory.clear()
+
+    bot = TerranBot(worker_dqn, train=False, capture=episode_capture(episode))
+    started = time()
+    result = sc2.run_game(sc2.maps.get("(2)RedshiftLE"), [
+        Bot(Race.Terran, bot),
+        Computer(Race.Protoss, Difficulty.MediumHard)
+        ], realtime=False)
+    if bot.capture is not None:
+        bot.capture.close()
+    bot.remember(reward=1000 if result == Result.Victory else -1000, done=True)
+    bot.profiler.write_summary(PROFILE_LOG, f"episode: {episode + 1}, result: {result}")
+
+    os.makedirs(f"{TRAIN_DIR}/episodes", exist_ok=True)
+    path = f"{TRAIN_DIR}/episodes/{episode}.npz"
+    worker_dqn.memory.save(path)
+    stats = episode_stats(bot, started)
+    stats["seed"] = seed
+    decay_steps = worker_dqn.decay_steps - decay_steps
+    return episode, str(result), episode_return(bot.rewards), decay_steps, path, stats
+
+def episode_capture(episode):
+    if CAPTURE_DIR is None:
+        return None
+    return ObservationCapture(f"{CAPTURE_DIR}/episode-{episode + 1}.obs.gz")
+
+def episode_stats(bot, started):
+    """
+    :return: <dict> the metrics log fields a finished game's bot can fill.
+    """
+    commands = bot.commands.stats()
+    return {
+        "steps": bot.iteration,
+        "wall_time": time() - started,
+        "commands_sent": commands["commands_sent"],
+        "requests_sent": commands["requests_sent"],
+        "phase_totals": bot.profiler.totals()
+    }
+
+def train_serial(dqn, metrics, learner=None):
+    """
+    Plays every episode in this process, training inline or on the learner.
+    """
     for episode in range(NUM_EPISODES):
-        bot = TerranBot(epsilon=epsilon)
+        random.seed(SEED + episode)
+        np.random.seed(SEED + episode)
+        bot = TerranBot(dqn, learner=learner, capture=episode_capture(episode))
+        started = time()
         result = sc2.run_game(sc2.maps.get("(2)RedshiftLE"), [
             Bot(Race.Terran, bot),
             Computer(Race.Protoss, Difficulty.MediumHard)
             ], realtime=False)
+        if bot.capture is not None:
+            bot.capture.close()
 
         if result == Result.Victory:
             bot.remember(reward=1000, done=True)
         else:
             bot.remember(reward=-1000, done=True)
+        reward = episode_return(bot.rewards)
 
-        reward = 0
-        for idx, r in enumerate(reversed(bot.rewards)):
-            reward += gamma**idx + r
-
-        bot.dqn.save(f"{TRAIN_DIR}/terran-dqn.h5")
-        epsilon = bot.dqn.epsilon
-
-        with open("results.log", "a") as log:
-            log.write(f"episode: {episode + 1}/{NUM_EPISODES}, epsilon: {epsilon:.3}, reward: {reward:.4f}, result: {result}\n")
-except KeyboardInterrupt as err:
-    pass
+        # weights and epsilon stay in memory; only checkpoint periodically
+        if learner is not None:
+            learner.end_episode()
+            if (episode + 1) % CHECKPOINT_FREQ == 0:
+                learner.save(f"{TRAIN_DIR}/terran-dqn.h5")
+        else:
+            dqn.end_episode()
+            if (episode + 1) % CHECKPOINT_FREQ == 0:
+                dqn.save(f"{TRAIN_DIR}/terran-dqn.h5")
+
+        learner_fields = {}
+        if learner is not None:
+            learner_metrics = learner.metrics()
+            learner_fields = {
+                "learner_steps": learner.steps,
+                "learner_steps_per_sec": learner_metrics["steps_per_sec"],
+                "queue_depth": learner_metrics["queue_depth"],
+                "policy_staleness": learner_metrics["staleness"]
+            }
+        metrics.append(episode + 1, result,
+                       seed=SEED + episode,
+                       epsilon=dqn.epsilon,
+                       replay_size=replay_size(dqn),
+                       reward=reward,
+                       **episode_stats(bot, started),
+                       **learner_fields)
+        bot.profiler.write_summary(PROFILE_LOG, f"episode: {episode + 1}/{NUM_EPISODES}, result: {result}")
+
+def replay_size(dqn):
+    return len(dqn.replay_store) if dqn.replay_store is not None else len(dqn.memory)
+
+def train_parallel(dqn, replay_store, metrics):
+    """
+    Central trainer for collector workers: folds every finished episode into
+    the replay store, trains on it and publishes the new policy.
+    """
+    steps = 0
+
+    def on_result(finished):
+        nonlocal steps
+        episode, result, reward, decay_steps, path, stats = finished
+        replay_store.extend(load_episode(path))
+        replay_store.flush()
+        os.remove(path)
+
+        # the schedule follows total experience, not the furthest worker
+        dqn.decay_epsilon(decay_steps)
+        for _ in range(TRAIN_STEPS_PER_EPISODE if len(replay_store) >= REPLAY_BATCH_SIZE else 0):
+            dqn.replay(REPLAY_BATCH_SIZE, decay_epsilon=False)
+            steps += 1
+            if steps % UPDATE_TARGET_FREQ == 0:
+                dqn.train_target_model()
+        dqn.save(POLICY_FILE)
+        if (episode + 1) % CHECKPOINT_FREQ == 0:
+            dqn.save(f"{TRAIN_DIR}/terran-dqn.h5")
+
+        metrics.append(episode + 1, result,
+                       epsilon=dqn.epsilon,
+                       replay_size=len(replay_store),
+                       learner_steps=steps,
+                       reward=reward,
+                       **stats)
+
+    collector = Collector(play_episode, NUM_COLLECTORS, base_seed=SEED)
+    collector.run(NUM_EPISODES, lambda episode: (dqn.epsilon,), on_result)
+
+if __name__ == "__main__":
+    if PRIORITIZED_REPLAY:
+        replay_store = PrioritizedDiskReplayMemory(f"{TRAIN_DIR}/replay", REPLAY_STORE_SIZE, 
+                                                   STATE_SHAPE)
+    else:
+        replay_store = DiskReplayMemory(f"{TRAIN_DIR}/replay", REPLAY_STORE_SIZE, STATE_SHAPE)
+    dqn = DQNModel(range(TerranBot.NUM_ACTIONS), 
+                   replay_store=replay_store, 
+                   prioritized=PRIORITIZED_REPLAY,
+                   double=DOUBLE_DQN,
+                   dueling=DUELING,
+                   target_tau=TARGET_TAU,
+                   state_shape=STATE_SHAPE)
+    learner = None
+    if ASYNC_LEARNER and NUM_COLLECTORS == 1:
+        learner = AsyncLearner(dqn, REPLAY_BATCH_SIZE, UPDATE_TARGET_FREQ, 
+                               replay_ratio=REPLAY_RATIO)
+        learner.start()
+
+    metrics = MetricsLog(METRICS_LOG, PHASES)
+
+    try:
+        if NUM_COLLECTORS > 1:
+            train_parallel(dqn, replay_store, metrics)
+        else:
+            train_serial(dqn, metrics, learner)
+    except KeyboardInterrupt as err:
+        pass
+    finally:
+        if learner is not None:
+            learner.stop()
+        metrics.close()
+        dqn.save(f"{TRAIN_DIR}/terran-dqn.h5")
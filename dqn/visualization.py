@@ -1,6 +1,10 @@
+from log_analysis import ResultsLog, MetricsReader
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+import time
+
 plt.style.use('ggplot')
 plt.rcParams['figure.figsize'] = [12, 4]
 
@@ -8,40 +12,33 @@ plt.rcParams['figure.figsize'] = [12, 4]
 # 575/1000 for Hard
 # 0/1000 for Insane
 
-def rolling_average(data, *, window_size):
-    """Smoothen the 1-d data array using a rollin average.
-
-    Taken from DQN programming assignments
-
-    Args:
-        data: 1-d numpy.array
-        window_size: size of the smoothing window
-
-    Returns:
-        smooth_data: a 1-d numpy.array with the same size as data
-    """
-    assert data.ndim == 1
-    kernel = np.ones(window_size)
-    smooth_data = np.convolve(data, kernel) / np.convolve(
-        np.ones_like(data), kernel
-    )
-    return smooth_data[: -window_size + 1]
-
-num_wins = 0
-with open("results-insane.log", 'r') as logfile:
-    results = logfile.readlines()
-    returns = np.zeros(len(results))
-    for idx, result in enumerate(results):
-        record = str.split(result, ', ')
-        reward = record[2][8:]
-        returns[idx] = float(reward)
-        if record[3][8:] == "Result.Victory\n":
-            num_wins += 1
-
-print(num_wins)
-plt.plot(rolling_average(returns, window_size=40), zorder=2)
-plt.plot(returns, zorder=1)
-plt.xlabel("Starcraft II Episode")
-plt.ylabel("Returns")
-plt.title("Starcraft DQN Insane Difficulty Returns")
-plt.show()
\ No newline at end of file
+# a text results log, or a binary metrics log (.bin) written by terran_ai
+LOG_FILE = "results-insane.log"
+WINDOW_SIZE = 40
+# keep redrawing as training appends to the log
+FOLLOW = False
+FOLLOW_INTERVAL = 5
+
+def plot(log):
+    plt.clf()
+    plt.plot(log.rolling_returns(WINDOW_SIZE), zorder=2)
+    plt.plot(log.returns, zorder=1)
+    plt.xlabel("Starcraft II Episode")
+    plt.ylabel("Returns")
+    plt.title("Starcraft DQN Insane Difficulty Returns")
+
+log = MetricsReader(LOG_FILE) if LOG_FILE.endswith(".bin") else ResultsLog(LOG_FILE)
+print(int(np.sum(log.wins)))
+plot(log)
+
+if FOLLOW:
+    plt.show(block=False)
+    while plt.get_fignums():
+        if log.update() > 0:
+            print(f"{len(log)} episodes, win rate over last {WINDOW_SIZE}: "
+                  f"{log.rolling_win_rate(WINDOW_SIZE)[-1]:.2f}, "
+                  f"epsilon: {log.epsilon[-1]:.3}")
+            plot(log)
+        plt.pause(FOLLOW_INTERVAL)
+else:
+    plt.show()
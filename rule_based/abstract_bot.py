@@ -1,26 +1,86 @@
+import repo_root
 from protocols import military_protocol
+from shared.profiler import make_profiler
+from shared.command_batcher import CommandBatcher
+from shared.unit_selections import UnitSelections
+from shared.spatial_index import StepIndices
+from shared.map_analysis import MapAnalysis
+from shared.observation_capture import ObservationCapture
 
 import sc2
 from sc2 import BotAI
 from sc2.constants import *
 from sc2.helpers import ControlGroup
 
+from time import time
+
 ITERATIONS_PER_MINUTE = 165
+# per-phase on_step latency histograms, summarized into PROFILE_LOG per game
+PROFILE = False
+PROFILE_LOG = "profile.log"
+# when set, every observation of a game is captured to 
+# CAPTURE_DIR/<bot>-<time>.obs.gz for replay with ObservationReplay
+CAPTURE_DIR = None
+
+DEPOT_TYPES = [SUPPLYDEPOT, SUPPLYDEPOTLOWERED, SUPPLYDEPOTDROP]
 
 class AbstractBot(sc2.BotAI, 
     military_protocol.MilitaryProtocol):
-    def __init__(self):
+    def __init__(self, capture=None):
+        """
+        :param capture: <ObservationCapture> optional sink for every 
+        observation the bot sees; defaults to one under CAPTURE_DIR if set.
+        """
+        if capture is None and CAPTURE_DIR is not None:
+            capture = ObservationCapture(f"{CAPTURE_DIR}/{type(self).__name__}-{int(time())}.obs.gz")
+        self.capture = capture
         self.attack_waves = set()
         self.max_workers = 65
+        self.profiler = make_profiler(PROFILE)
+        self.commands = CommandBatcher(self)
+        self.selections = UnitSelections()
+        self.spatial = StepIndices(self)
+        self.map_analysis = None
 
-    async def on_step(self, iteration):
+    def start_step(self, iteration):
+        """
+        Captures the observation if asked to, drops last step's cached 
+        selections and indices and loads the map analysis on the first step; 
+        called first thing in every on_step.
+        """
+        if self.capture is not None:
+            self.capture.record(self, iteration)
         self.iteration = iteration
+        self.selections.reset(self.units)
+        self.spatial.reset()
+        if self.map_analysis is None:
+            self.map_analysis = MapAnalysis.load(self)
+
+    async def on_step(self, iteration):
+        self.start_step(iteration)
         if not self.townhalls.exists:
-            for unit in self.units:
-                await self.do(unit.attack(self.target))
+            with self.profiler.phase("last_stand"):
+                for unit in self.units:
+                    await self.do(unit.attack(self.target))
             return
 
-        await self.distribute_workers()
+        with self.profiler.phase("distribute_workers"):
+            await self.distribute_workers()
+
+    async def do(self, action):
+        """
+        Queues the command on the step's batch; concrete bots decorate their 
+        on_step with flushes_commands to send it.
+        """
+        return self.commands.queue(action)
+
+    async def on_end(self, game_result):
+        if self.capture is not None:
+            self.capture.close()
+        self.profiler.write_summary(PROFILE_LOG, f"{type(self).__name__}, result: {game_result}")
+        commands = self.commands.stats()
+        print(f"commands: {commands['commands_sent']} in {commands['requests_sent']} requests, "
+              f"round trips saved: {commands['round_trips_saved']}, failed: {commands['commands_failed']}")
 
     def prepare_attack(self, military_ratio, interval=10):
         """
@@ -42,15 +102,15 @@ class AbstractBot(sc2.BotAI,
                 continue
 
             amount = military_ratio[unit]
-            units = self.units(unit)
+            idle = self.selections.idle(unit)
 
-            if units.idle.amount >= amount:
+            if idle.amount >= amount:
                 if unit != MEDIVAC:
                     added_non_medic_units = True
                 if attack_wave is None:
-                    attack_wave = ControlGroup(units.idle)
+                    attack_wave = ControlGroup(idle)
                 else:
-                    attack_wave.add_units(units.idle)
+                    attack_wave.add_units(idle)
         if attack_wave is not None and 0 < len(attack_wave) > 12:
             self.attack_waves.add(attack_wave)
 
@@ -0,0 +1,6 @@
+import repo_root
+from shared.headless import bench
+from mmm_push import MMMBot
+from five_rax_rush import ProxyRaxRushBot
+
+bench({"MMMBot": MMMBot, "ProxyRaxRushBot": ProxyRaxRushBot}, "scripted builds")
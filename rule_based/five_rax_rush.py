@@ -1,4 +1,6 @@
-from abstract_bot import AbstractBot
+import repo_root
+from abstract_bot import AbstractBot, DEPOT_TYPES
+from shared.command_batcher import flushes_commands
 
 import sc2
 from sc2 import Race, Difficulty
@@ -6,22 +8,29 @@ from sc2.constants import *
 from sc2.player import Bot, Computer
 
 class ProxyRaxRushBot(AbstractBot):
+    @flushes_commands
     async def on_step(self, iteration):
-        self.iteration = iteration
+        self.start_step(iteration)
+        profiler = self.profiler
         if not self.townhalls.exists:
-            for unit in self.workers | self.marines:
-                await self.do(unit.attack(self.target))
+            with profiler.phase("last_stand"):
+                for unit in self.workers | self.marines:
+                    await self.do(unit.attack(self.target))
             return
         self.command_center = self.townhalls.first
 
         military = {
             MARINE: 15
         }
-        self.prepare_attack(military, interval=21)
-        await self.manage_workers()
-        await self.manage_supply()
+        with profiler.phase("prepare_attack"):
+            self.prepare_attack(military, interval=21)
+        with profiler.phase("manage_workers"):
+            await self.manage_workers()
+        with profiler.phase("manage_supply"):
+            await self.manage_supply()
         await self.handle_military()
-        await self.task_workers()
+        with profiler.phase("task_workers"):
+            await self.task_workers()
 
     async def manage_workers(self):
         if self.can_afford(SCV) and self.workers.amount <= 15 \
@@ -33,25 +42,18 @@ class ProxyRaxRushBot(AbstractBot):
 
         if self.supply_left < supply_threshold and \
         self.can_afford(SUPPLYDEPOT) and self.already_pending(SUPPLYDEPOT) < 2:
-            position = self.command_center.position.towards(
-                self.game_info.map_center, 5)
+            position = self.map_analysis.depot_position(
+                self.command_center.position, self.game_info.map_center)
             await self.build(SUPPLYDEPOT, position)
 
     async def manage_military_training_structures(self): 
-        if not self.units.of_type([
-            SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-            ]).ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return   
 
         if self.barracks.amount < 3 or \
         (self.barracks.amount < 5 and self.minerals > 400):
             if self.can_afford(BARRACKS):
-                game_info = self.game_info
-                position = game_info.map_center.towards(
-                    self.enemy_start_locations[0], 25)
-                await self.build(BARRACKS, near=position)
+                await self.build(BARRACKS, near=self.map_analysis.proxy_barracks[0])
 
     async def manage_military_add_ons(self):
         pass
@@ -60,31 +62,32 @@ class ProxyRaxRushBot(AbstractBot):
         pass
 
     async def task_workers(self):
-        min_field = self.state.mineral_field.closest_to(self.command_center)
-        for scv in self.units(SCV).idle:
+        min_field = self.spatial.minerals.closest_to(self.command_center)
+        for scv in self.selections.idle(SCV):
             await self.do(scv.gather(min_field))
 
     async def train_military(self):
-        for rax in self.units(BARRACKS).ready.noqueue:
+        for rax in self.selections.ready_noqueue(BARRACKS):
             if not self.can_afford(MARINE):
                 break
             await self.do(rax.train(MARINE))
 
     @property
     def barracks(self):
-        return self.units(BARRACKS)
+        return self.selections(BARRACKS)
     
     @property
     def marines(self):
-        return self.units(MARINE)
+        return self.selections(MARINE)
 
 
 # Can beat elite protoss and terran AI with ease
 # Loses occasionally to elite early zergling/roach push
-result = sc2.run_game(sc2.maps.get("(2)RedshiftLE"), [
-    Bot(Race.Terran, ProxyRaxRushBot()),
-    Computer(Race.Protoss, Difficulty.VeryHard)
-    ], realtime=False)
-
-print("----")
-print(result)
\ No newline at end of file
+if __name__ == "__main__":
+    result = sc2.run_game(sc2.maps.get("(2)RedshiftLE"), [
+        Bot(Race.Terran, ProxyRaxRushBot()),
+        Computer(Race.Protoss, Difficulty.VeryHard)
+        ], realtime=False)
+
+    print("----")
+    print(result)
\ No newline at end of file
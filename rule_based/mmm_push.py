@@ -1,6 +1,8 @@
+import repo_root
 from protocols import gas_protocol, expansion_protocol
 
-from abstract_bot import AbstractBot
+from abstract_bot import AbstractBot, DEPOT_TYPES
+from shared.command_batcher import flushes_commands
 
 import sc2
 from sc2 import Race, Difficulty
@@ -8,16 +10,19 @@ from sc2.player import Bot, Computer, Human
 from sc2.constants import *
 
 class MMMBot(AbstractBot):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, capture=None):
+        super().__init__(capture)
         self.gas_handler = gas_protocol.GasProtocol(self)
         self.expansion_handler = expansion_protocol.ExpansionProtocol(self)
 
+    @flushes_commands
     async def on_step(self, iteration):
         await super().on_step(iteration)
+        profiler = self.profiler
         if 5 > self.townhalls.amount < self.minutes_elapsed / 2.9:
-            await self.expansion_handler.expand(
-                max(3, 2 + self.minutes_elapsed / 4))
+            with profiler.phase("expand"):
+                await self.expansion_handler.expand(
+                    max(3, 2 + self.minutes_elapsed / 4))
             return
 
         military = {
@@ -26,10 +31,14 @@ class MMMBot(AbstractBot):
             MEDIVAC: 2
         }
 
-        self.prepare_attack(military)
-        await self.manage_workers()
-        await self.manage_gas()
-        await self.manage_supply()
+        with profiler.phase("prepare_attack"):
+            self.prepare_attack(military)
+        with profiler.phase("manage_workers"):
+            await self.manage_workers()
+        with profiler.phase("manage_gas"):
+            await self.manage_gas()
+        with profiler.phase("manage_supply"):
+            await self.manage_supply()
         await self.handle_military()
 
     async def manage_workers(self):
@@ -41,7 +50,7 @@ class MMMBot(AbstractBot):
         or self.max_workers <= self.workers.amount:
             return
 
-        for base in self.units(COMMANDCENTER).ready.noqueue:
+        for base in self.selections.ready_noqueue(COMMANDCENTER):
             if self.can_afford(SCV):
                 await self.do(base.train(SCV))
 
@@ -50,7 +59,7 @@ class MMMBot(AbstractBot):
         Logic to have workers build refineries then assign workers as needed.
         """
 
-        if self.units(BARRACKS).exists:
+        if self.selections(BARRACKS).exists:
             await self.gas_handler.manage_gas(1.5)
 
     async def manage_supply(self):
@@ -58,19 +67,16 @@ class MMMBot(AbstractBot):
         Manages supply limits. Supply depots are lowered when built.
         """
 
-        if self.supply_cap >= 200 and self.units.of_type([SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-            ]).ready.exists:
+        if self.supply_cap >= 200 and self.selections.ready(DEPOT_TYPES).exists:
                 return
 
         if self.supply_left < 4 and self.can_afford(SUPPLYDEPOT) \
         and self.already_pending(SUPPLYDEPOT) < 2:
-            position = self.townhalls.random.position.towards(
-                self.game_info.map_center, 5)
+            position = self.map_analysis.depot_position(
+                self.townhalls.random.position, self.game_info.map_center)
             await self.build(SUPPLYDEPOT, position)
 
-        for depot in self.units(SUPPLYDEPOT).ready:
+        for depot in self.selections.ready(SUPPLYDEPOT):
             await self.do(depot(MORPH_SUPPLYDEPOT_LOWER))
 
     async def manage_military_training_structures(self):
@@ -81,43 +87,39 @@ class MMMBot(AbstractBot):
         upgrades are researched.
         """
 
-        if not self.units.of_type([
-            SUPPLYDEPOT, 
-            SUPPLYDEPOTLOWERED, 
-            SUPPLYDEPOTDROP
-            ]).ready.exists:
+        if not self.selections.ready(DEPOT_TYPES).exists:
             return 
 
-        if self.units(BARRACKS).amount < max(4, self.minutes_elapsed / 2):
+        if self.selections(BARRACKS).amount < max(4, self.minutes_elapsed / 2):
             if self.can_afford(BARRACKS):
                 await self.build(BARRACKS, 
                     near=self.townhalls.random.position, 
                     placement_step=5)
 
-        if self.units(BARRACKS).ready.amount < 1:
+        if self.selections.ready(BARRACKS).amount < 1:
             return
 
-        for barrack in self.units(BARRACKS).ready.noqueue:
+        for barrack in self.selections.ready_noqueue(BARRACKS):
             if not barrack.has_add_on and self.can_afford(BARRACKSTECHLAB):
                 await self.do(barrack.build(BARRACKSTECHLAB))
 
-        if self.units(FACTORY).amount < 1:
+        if self.selections(FACTORY).amount < 1:
             if self.can_afford(FACTORY):
                 await self.build(FACTORY, 
                     near=self.townhalls.random.position, 
                     placement_step=7)
 
-        if self.units(FACTORY).ready.amount < 1:
+        if self.selections.ready(FACTORY).amount < 1:
             return
 
-        if self.units(STARPORT).amount < max(2, self.minutes_elapsed / 2 - 5):
+        if self.selections(STARPORT).amount < max(2, self.minutes_elapsed / 2 - 5):
             if self.can_afford(STARPORT):
                 await self.build(STARPORT, 
                     near=self.townhalls.random.position, 
                     placement_step=7)
 
     async def manage_military_add_ons(self):
-        for rax_lab in self.units(BARRACKSTECHLAB).ready.noqueue:
+        for rax_lab in self.selections.ready_noqueue(BARRACKSTECHLAB):
             abilities = await self.get_available_abilities(rax_lab)
             for ability in abilities:
                 if self.can_afford(ability):
@@ -131,19 +133,20 @@ class MMMBot(AbstractBot):
         Trains our bio-terran MMM army.
         """
 
-        for rax in self.units(BARRACKS).ready.noqueue:
+        for rax in self.selections.ready_noqueue(BARRACKS):
             if self.can_afford(MARAUDER) and rax.has_add_on:
                 await self.do(rax.train(MARAUDER))
             elif self.can_afford(MARINE):
                 await self.do(rax.train(MARINE))
-        for sp in self.units(STARPORT).ready.noqueue:
+        for sp in self.selections.ready_noqueue(STARPORT):
             if not self.can_afford(MEDIVAC):
                 break
             await self.do(sp.train(MEDIVAC))
     
 
 # RUN GAME
-sc2.run_game(sc2.maps.get('(2)RedshiftLE'), [
-    Bot(Race.Terran, MMMBot()), 
-    Computer(Race.Protoss, Difficulty.Medium)
-    ], realtime=False)
\ No newline at end of file
+if __name__ == "__main__":
+    sc2.run_game(sc2.maps.get('(2)RedshiftLE'), [
+        Bot(Race.Terran, MMMBot()), 
+        Computer(Race.Protoss, Difficulty.Medium)
+        ], realtime=False)
\ No newline at end of file
@@ -11,7 +11,8 @@ class ExpansionProtocol(object):
             return
 
         if self.bot.can_afford(self.townhall_unit):
-            await self.bot.expand_now()
+            location = self.bot.map_analysis.next_expansion(self.bot.townhalls)
+            await self.bot.expand_now(location=location)
 
     @property
     def townhall_unit(self):
@@ -8,7 +8,7 @@ class GasProtocol(object):
     async def manage_gas(self, base_vg_ratio = 2):
         if self.bot.geysers.amount < self.bot.townhalls.amount * base_vg_ratio:
             for cc in self.bot.townhalls:
-                for vg in self.bot.state.vespene_geyser.closer_than(15, cc):
+                for vg in self.bot.spatial.geysers.closer_than(15, cc):
                     if self.bot.geysers.closer_than(1, vg).exists:
                         break
 
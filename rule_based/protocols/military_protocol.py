@@ -3,11 +3,16 @@ from abc import ABC, abstractmethod
 class MilitaryProtocol(ABC):
 
     async def handle_military(self):
-        await self.manage_military_training_structures()
-        await self.manage_military_add_ons()
-        await self.manage_military_research_structures()
-        await self.train_military()
-        await self.attack()
+        with self.profiler.phase("manage_military_training_structures"):
+            await self.manage_military_training_structures()
+        with self.profiler.phase("manage_military_add_ons"):
+            await self.manage_military_add_ons()
+        with self.profiler.phase("manage_military_research_structures"):
+            await self.manage_military_research_structures()
+        with self.profiler.phase("train_military"):
+            await self.train_military()
+        with self.profiler.phase("attack"):
+            await self.attack()
 
     @abstractmethod
     def prepare_attack(self, military_ratio, interval=10):
@@ -0,0 +1,21 @@
+import repo_root
+from shared.observation_capture import replay_into
+from mmm_push import MMMBot
+from five_rax_rush import ProxyRaxRushBot
+
+import sys
+
+BOTS = {"MMMBot": MMMBot, "ProxyRaxRushBot": ProxyRaxRushBot}
+
+def replay(path, bot_name, start=0, stop=None):
+    """
+    Replays a capture into a fresh bot of the named class; see
+    observation_capture.replay_into.
+    """
+    replay_into(BOTS[bot_name](), bot_name, path, start, stop)
+
+if __name__ == "__main__":
+    # replay_capture.py <capture> <bot> [start] [stop]
+    path, bot_name = sys.argv[1:3]
+    bounds = [int(arg) for arg in sys.argv[3:5]]
+    replay(path, bot_name, *bounds)
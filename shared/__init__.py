@@ -0,0 +1,5 @@
+"""
+Modules shared by the dqn, basic_cnn and rule_based bots. The script
+folders import them as shared.<module> after importing their repo_root
+module, which puts the repository root on sys.path.
+"""
@@ -0,0 +1,147 @@
+from sc2.data import ActionResult
+
+import functools
+
+class CommandBatcher:
+    """
+    Collects the unit commands a bot issues during one step and sends them
+    to the game in a single request when the step ends.
+
+    Commands for the same ability, target and queue flag are merged into
+    one multi-unit order, so an army told to attack one point costs one
+    action no matter how many units it has. As with sequential self.do
+    calls, a unit's last unqueued command in a step overrides its earlier
+    ones, and the cost charged for those is refunded; train and research
+    orders join the building's production queue instead, like in the game.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._commands = {}
+
+        self.commands_queued = 0
+        self.commands_sent = 0
+        self.orders_sent = 0
+        self.requests_sent = 0
+        self.commands_failed = 0
+
+    def queue(self, action):
+        """
+        Queues a UnitCommand, charging its cost right away so can_afford
+        checks later in the step see it.
+
+        :return: <ActionResult> ActionResult.Error when the bot can't afford
+        the command, as BotAI.do returns, None once it is queued.
+        """
+        kept = self._commands.get(action.unit.tag, [])
+        replaced = []
+        if not action.queue and not _joins_production_queue(action.ability):
+            replaced = [pending for pending in kept
+                        if not _joins_production_queue(pending.ability)]
+            kept = [pending for pending in kept
+                    if _joins_production_queue(pending.ability)]
+        refund = [self._cost(replaced_action) for replaced_action in replaced]
+        refund_minerals = sum(cost.minerals for cost in refund)
+        refund_vespene = sum(cost.vespene for cost in refund)
+
+        cost = self._cost(action)
+        if cost.minerals > self.bot.minerals + refund_minerals \
+        or cost.vespene > self.bot.vespene + refund_vespene:
+            print(f"cannot afford {action.ability} for unit {action.unit.tag}")
+            return ActionResult.Error
+
+        self.bot.minerals += refund_minerals - cost.minerals
+        self.bot.vespene += refund_vespene - cost.vespene
+        self._commands[action.unit.tag] = kept + [action]
+        self.commands_queued += 1
+        return None
+
+    def _cost(self, action):
+        return self.bot._game_data.calculate_ability_cost(action.ability)
+
+    def __len__(self):
+        return sum(len(actions) for actions in self._commands.values())
+
+    async def flush(self):
+        """
+        Sends every queued command, in one request unless a unit repeats a
+        production order, and prints each order the game rejects with its
+        ability and units, as BotAI.do logs its errors.
+
+        :return: <list> ActionResult of every order that failed, None when
+        nothing was queued.
+        """
+        if not self._commands:
+            return None
+
+        # the client merges identical orders into one set of unit tags, so a
+        # unit's repeated order (e.g. a second SCV) goes in the next request
+        requests = []
+        for actions in self._commands.values():
+            repeats = {}
+            for action in actions:
+                target = action.target.tag if hasattr(action.target, "tag") else action.target
+                key = (action.ability, target, action.queue)
+                repeat = repeats.get(key, 0)
+                repeats[key] = repeat + 1
+                if repeat == len(requests):
+                    requests.append({})
+                requests[repeat].setdefault(key, []).append(action)
+        self._commands = {}
+
+        errors = []
+        for orders in requests:
+            errors += await self._send(orders)
+        return errors
+
+    async def _send(self, orders):
+        actions = [action for merged in orders.values() for action in merged]
+        # one result per merged order, in the order they were packed
+        results = await self.bot._client.actions(actions, game_data=self.bot._game_data, 
+                                                 return_successes=True)
+        self.commands_sent += len(actions)
+        self.orders_sent += len(orders)
+        self.requests_sent += 1
+
+        errors = []
+        for merged, result in zip(orders.values(), results):
+            if result == ActionResult.Success:
+                continue
+            errors.append(result)
+            self.commands_failed += len(merged)
+            print(f"{result}: {merged[0].ability} for units "
+                  + ", ".join(str(action.unit.tag) for action in merged))
+        return errors
+
+    def stats(self):
+        """
+        :return: <dict> commands queued and sent, merged orders sent, game
+        requests made, the round trips saved against one per command and 
+        the commands the game rejected.
+        """
+        return {
+            "commands_queued": self.commands_queued,
+            "commands_sent": self.commands_sent,
+            "orders_sent": self.orders_sent,
+            "requests_sent": self.requests_sent,
+            "round_trips_saved": self.commands_queued - self.requests_sent,
+            "commands_failed": self.commands_failed
+        }
+
+def _joins_production_queue(ability):
+    # train and research orders queue up on the building even when unqueued
+    name = getattr(ability, "name", type(ability).__name__).upper()
+    return "TRAIN" in name or "RESEARCH" in name
+
+def flushes_commands(on_step):
+    """
+    Decorates a bot's on_step so the commands it queued on bot.commands are
+    sent once the step returns, including on early returns.
+    """
+    @functools.wraps(on_step)
+    async def step(bot, iteration):
+        try:
+            return await on_step(bot, iteration)
+        finally:
+            await bot.commands.flush()
+    return step
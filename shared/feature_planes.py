@@ -0,0 +1,71 @@
+import numpy as np
+
+# spatial planes, each counting the units of one group per cell
+SPATIAL_PLANES = ["own_units", "own_structures", "enemy_units", "enemy_structures", "resources"]
+# scalar planes, each a constant fill of one value in [0, 1]
+SCALAR_PLANES = ["minerals", "vespene", "supply_left", "supply_cap", "military"]
+DOWNSAMPLE = 4
+
+class FeaturePlaneEncoder:
+    """
+    Encodes the game state as a compact stack of uint8 feature planes
+    instead of an RGB drawing.
+
+    The map is cut into downsample x downsample cells. Every spatial plane
+    holds how many units of its group sit in each cell, saturating at 255;
+    every scalar plane is filled with one value scaled to [0, 255]. Planes
+    are in image orientation like the rendered frames, and are written
+    into one reused buffer.
+    """
+
+    def __init__(self, map_size, downsample=DOWNSAMPLE, spatial_planes=SPATIAL_PLANES,
+                 scalar_planes=SCALAR_PLANES):
+        """
+        :param map_size: <tuple> (width, height) of the map in game units.
+        """
+        self.width, self.height = int(map_size[0]), int(map_size[1])
+        self.downsample = downsample
+        self.spatial_planes = list(spatial_planes)
+        self.scalar_planes = list(scalar_planes)
+
+        self.rows = -(-self.height // downsample)
+        self.cols = -(-self.width // downsample)
+        self.frame = np.zeros(self.shape, np.uint8)
+        # channel major scratch, so each plane's counts are one bincount
+        self._counts = np.zeros((len(self.spatial_planes), self.rows * self.cols), np.int64)
+
+    @property
+    def shape(self):
+        return (self.rows, self.cols, len(self.spatial_planes) + len(self.scalar_planes))
+
+    def encode(self, positions, scalars):
+        """
+        :param positions: <list> [np.ndarray] (N, 2) game coordinates of the
+        units of each spatial plane, in spatial_planes order.
+        :param scalars: <list> [float] value of each scalar plane in [0, 1],
+        in scalar_planes order.
+        :return: <np.ndarray> (rows, cols, channels) uint8 frame; reused, so
+        copy it to keep it past the next encode.
+        """
+        cells = self.rows * self.cols
+        for plane, plane_positions in enumerate(positions):
+            if len(plane_positions) == 0:
+                self._counts[plane] = 0
+                continue
+            plane_positions = np.asarray(plane_positions, np.float32).reshape(-1, 2)
+            cols = np.clip(plane_positions[:, 0].astype(np.intp) // self.downsample, 0, self.cols - 1)
+            rows = np.clip((self.height - 1 - plane_positions[:, 1].astype(np.intp)) // self.downsample,
+                           0, self.rows - 1)
+            self._counts[plane] = np.bincount(rows * self.cols + cols, minlength=cells)
+
+        spatial = len(self.spatial_planes)
+        self.frame[..., :spatial] = np.minimum(self._counts, 255).T.reshape(
+            self.rows, self.cols, spatial)
+        self.frame[..., spatial:] = np.round(np.clip(scalars, 0.0, 1.0) * 255).astype(np.uint8)
+        return self.frame
+
+def unit_positions(units):
+    """
+    :return: <np.ndarray> (N, 2) float32 game coordinates of the units.
+    """
+    return np.array([unit.position for unit in units], np.float32).reshape(-1, 2)
@@ -0,0 +1,528 @@
+import sc2
+from sc2 import Race, Result
+from sc2.constants import *
+from sc2.ids.ability_id import AbilityId
+from sc2.position import Point2
+
+import asyncio
+import math
+import random
+from collections import namedtuple
+from time import perf_counter
+
+MAP_SIZE = (152, 184)
+MAP_NAME = "Headless"
+GAME_LOOPS_PER_STEP = 8
+INCOME_PER_STEP = 40
+# games and steps each bot is timed over by bench
+BENCH_UNIT_COUNTS = [10, 100, 500]
+BENCH_STEPS = 500
+BENCH_SEED = 0
+
+# stand ins for the game's ability ids of train and build orders
+TrainAbility = namedtuple("TrainAbility", "type_id")
+BuildAbility = namedtuple("BuildAbility", "type_id")
+Command = namedtuple("Command", "ability unit target queue")
+Cost = namedtuple("Cost", "minerals vespene")
+Score = namedtuple("Score", "score")
+
+# <dict> [UnitId: tuple] (minerals, vespene) for whatever the bots build.
+COSTS = {
+    SCV: (50, 0), MARINE: (50, 0), MARAUDER: (100, 25), HELLION: (100, 0),
+    MEDIVAC: (100, 100), SUPPLYDEPOT: (100, 0), BARRACKS: (150, 0),
+    BARRACKSTECHLAB: (50, 25), BARRACKSREACTOR: (50, 50), FACTORY: (150, 100),
+    STARPORT: (150, 100), REFINERY: (75, 0), COMMANDCENTER: (400, 0),
+    ORBITALCOMMAND: (150, 0)
+}
+RESEARCH_COST = (100, 100)
+
+STRUCTURES = {
+    COMMANDCENTER, ORBITALCOMMAND, SUPPLYDEPOT, SUPPLYDEPOTLOWERED, BARRACKS,
+    BARRACKSTECHLAB, BARRACKSREACTOR, FACTORY, STARPORT, REFINERY,
+    NEXUS, PYLON, GATEWAY, CYBERNETICSCORE, ASSIMILATOR
+}
+TOWNHALLS = {COMMANDCENTER, ORBITALCOMMAND, NEXUS}
+WORKERS = {SCV, PROBE}
+RADII = {COMMANDCENTER: 2.75, ORBITALCOMMAND: 2.75, NEXUS: 2.75, BARRACKS: 1.8,
+         GATEWAY: 1.8, FACTORY: 1.8, STARPORT: 1.8, CYBERNETICSCORE: 1.8,
+         SUPPLYDEPOT: 1.0, SUPPLYDEPOTLOWERED: 1.0, PYLON: 1.0, REFINERY: 1.5,
+         ASSIMILATOR: 1.5, BARRACKSTECHLAB: 1.0}
+
+# <dict> [UnitId: int] relative counts of a mid game army and base
+OWN_MIX = {
+    SCV: 40, MARINE: 30, MARAUDER: 12, MEDIVAC: 4, HELLION: 6, BARRACKS: 5,
+    BARRACKSTECHLAB: 2, FACTORY: 1, STARPORT: 1, SUPPLYDEPOT: 3,
+    SUPPLYDEPOTLOWERED: 6, COMMANDCENTER: 1, ORBITALCOMMAND: 1, REFINERY: 2
+}
+ENEMY_MIX = {
+    PROBE: 35, ZEALOT: 20, STALKER: 20, OBSERVER: 2, PYLON: 8, GATEWAY: 5,
+    CYBERNETICSCORE: 1, NEXUS: 2, ASSIMILATOR: 2
+}
+
+class FakeUnit:
+    """
+    The parts of sc2's Unit the bots read, plus command builders that
+    return plain Command tuples.
+    """
+
+    def __init__(self, tag, type_id, position, is_ready=True):
+        self.tag = tag
+        self.type_id = type_id
+        self.position = Point2(position)
+        self.is_ready = is_ready
+        self.orders = []
+        self.radius = RADII.get(type_id, 0.5)
+        self.energy = 0
+        self.add_on_tag = 0
+        self.mineral_contents = 1800
+        self.assigned_harvesters = 0
+        self.ideal_harvesters = 3
+
+    @property
+    def name(self):
+        return self.type_id.name.title()
+
+    @property
+    def is_structure(self):
+        return self.type_id in STRUCTURES
+
+    @property
+    def is_idle(self):
+        return not self.orders
+
+    @property
+    def noqueue(self):
+        return not self.orders
+
+    @property
+    def has_add_on(self):
+        return self.add_on_tag != 0
+
+    @property
+    def is_gathering(self):
+        return bool(self.orders) and self.orders[0] == AbilityId.HARVEST_GATHER
+
+    def distance_to(self, target):
+        return self.position.distance_to(getattr(target, "position", target))
+
+    def __call__(self, ability, target=None, queue=False):
+        return Command(ability, self, target, queue)
+
+    def attack(self, target, queue=False):
+        return self(AbilityId.ATTACK, target, queue)
+
+    def move(self, target, queue=False):
+        return self(AbilityId.MOVE, target, queue)
+
+    def gather(self, target, queue=False):
+        return self(AbilityId.HARVEST_GATHER, target, queue)
+
+    def train(self, unit_type, queue=False):
+        return self(TrainAbility(unit_type), None, queue)
+
+    def build(self, unit_type, target=None, queue=False):
+        return self(BuildAbility(unit_type), target, queue)
+
+class FakeUnits(list):
+    """
+    The parts of sc2's Units the bots use, over a plain list.
+    """
+
+    def __call__(self, unit_types):
+        return self.of_type(unit_types)
+
+    def of_type(self, unit_types):
+        if not isinstance(unit_types, (list, tuple, set, frozenset)):
+            unit_types = {unit_types}
+        unit_types = set(unit_types)
+        return self.filter(lambda unit: unit.type_id in unit_types)
+
+    def filter(self, pred):
+        return self.subgroup(unit for unit in self if pred(unit))
+
+    def subgroup(self, units):
+        return FakeUnits(units)
+
+    def __or__(self, other):
+        tags = {unit.tag for unit in self}
+        return self.subgroup(list(self) + [unit for unit in other if unit.tag not in tags])
+
+    @property
+    def amount(self):
+        return len(self)
+
+    @property
+    def exists(self):
+        return len(self) > 0
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def first(self):
+        return self[0]
+
+    @property
+    def random(self):
+        return random.choice(self)
+
+    def random_or(self, other):
+        return random.choice(self) if self else other
+
+    @property
+    def tags(self):
+        return {unit.tag for unit in self}
+
+    @property
+    def ready(self):
+        return self.filter(lambda unit: unit.is_ready)
+
+    @property
+    def idle(self):
+        return self.filter(lambda unit: unit.is_idle)
+
+    @property
+    def noqueue(self):
+        return self.filter(lambda unit: unit.noqueue)
+
+    @property
+    def gathering(self):
+        return self.filter(lambda unit: unit.is_gathering)
+
+    @property
+    def structure(self):
+        return self.filter(lambda unit: unit.is_structure)
+
+    @property
+    def not_structure(self):
+        return self.filter(lambda unit: not unit.is_structure)
+
+    def closer_than(self, distance, position):
+        return self.filter(lambda unit: unit.distance_to(position) < distance)
+
+    def closest_to(self, position):
+        return min(self, key=lambda unit: unit.distance_to(position))
+
+class FakeClient:
+    """
+    Records the command batches the bot sends instead of talking to a game.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    async def actions(self, actions, game_data=None, return_successes=False):
+        if not isinstance(actions, list):
+            actions = [actions]
+        self.game.receive(actions)
+        return []
+
+class FakeGameData:
+    def calculate_ability_cost(self, ability):
+        if isinstance(ability, (TrainAbility, BuildAbility)):
+            return Cost(*COSTS.get(ability.type_id, (0, 0)))
+        return Cost(0, 0)
+
+class FakeGameInfo:
+    def __init__(self, map_size, start_location):
+        self.map_size = Point2(map_size)
+        self.map_center = Point2((map_size[0] / 2, map_size[1] / 2))
+        self.map_name = MAP_NAME
+        self.player_start_location = start_location
+
+class FakeState:
+    def __init__(self, game):
+        self.game = game
+
+    @property
+    def game_loop(self):
+        return self.game.game_loop
+
+    @property
+    def score(self):
+        return Score(self.game.game_loop)
+
+    @property
+    def mineral_field(self):
+        return self.game.mineral_fields
+
+    @property
+    def vespene_geyser(self):
+        return self.game.geysers
+
+    @property
+    def units(self):
+        return self.game.own_units | self.game.enemy_units
+
+class HeadlessGame:
+    """
+    Drives a bot's on_step against a synthetic, deterministic game state at
+    full speed, without the SC2 client.
+
+    The bot is switched to a subclass whose game facing properties
+    (units, state, game_info, resources, ...) read from this object, and
+    whose actions are recorded here rather than sent. The world is seeded:
+    the same seed and unit count replay the same steps. Unit counts stay
+    fixed so step timings at a given scale are comparable; units only
+    drift around and pick up or drop orders.
+    """
+
+    def __init__(self, num_units, seed=0, map_size=MAP_SIZE):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.map_size = map_size
+        self.game_loop = 0
+        self.minerals = 400
+        self.vespene = 100
+        self.commands = []
+        self.requests = 0
+        self._next_tag = 1
+
+        width, height = map_size
+        self.start_location = Point2((width * 0.2, height * 0.2))
+        self.enemy_start_location = Point2((width * 0.8, height * 0.8))
+        self.game_info = FakeGameInfo(map_size, self.start_location)
+        self.state = FakeState(self)
+        self.client = FakeClient(self)
+        self.game_data = FakeGameData()
+
+        # bases mirrored across the map, like a two player ladder map
+        self.expansion_locations = {}
+        self.mineral_fields = FakeUnits()
+        self.geysers = FakeUnits()
+        for i in range(4):
+            offset = Point2((width * 0.15 * (i % 2), height * 0.2 * (i // 2)))
+            for base in [self.start_location + offset, self.enemy_start_location - offset]:
+                resources = self._resources(base)
+                self.expansion_locations[base] = resources
+
+        self.own_units = self._spawn(OWN_MIX, num_units, self.start_location)
+        self.enemy_units = self._spawn(ENEMY_MIX, max(1, num_units // 2), self.enemy_start_location)
+        for townhall in self.own_units(TOWNHALLS):
+            townhall.position = self.start_location
+
+    def _tag(self):
+        self._next_tag += 1
+        return self._next_tag
+
+    def _resources(self, base):
+        resources = FakeUnits()
+        for i in range(8):
+            angle = math.pi * (0.75 + i / 8)
+            mineral = FakeUnit(self._tag(), MINERALFIELD,
+                               (base.x + 7 * math.cos(angle), base.y + 7 * math.sin(angle)))
+            resources.append(mineral)
+            self.mineral_fields.append(mineral)
+        for angle in [0.1, 1.4]:
+            geyser = FakeUnit(self._tag(), VESPENEGEYSER,
+                              (base.x + 7 * math.cos(angle), base.y + 7 * math.sin(angle)))
+            resources.append(geyser)
+            self.geysers.append(geyser)
+        return resources
+
+    def _spawn(self, mix, count, center):
+        types = list(mix)
+        units = FakeUnits()
+        # at least one townhall, so the bots play their normal step
+        chosen = [types[[t in TOWNHALLS for t in types].index(True)]]
+        chosen += self.rng.choices(types, [mix[t] for t in types], k=count - 1)
+        for type_id in chosen:
+            spread = 12 if type_id in STRUCTURES else 30
+            position = (min(max(center.x + self.rng.uniform(-spread, spread), 0), self.map_size[0] - 1),
+                        min(max(center.y + self.rng.uniform(-spread, spread), 0), self.map_size[1] - 1))
+            unit = FakeUnit(self._tag(), type_id, position, is_ready=self.rng.random() < 0.9)
+            if type_id == ORBITALCOMMAND:
+                unit.energy = 50
+            units.append(unit)
+        return units
+
+    @property
+    def supply_cap(self):
+        depots = len(self.own_units([SUPPLYDEPOT, SUPPLYDEPOTLOWERED]))
+        return min(200, 15 * len(self.own_units(TOWNHALLS)) + 8 * depots)
+
+    @property
+    def supply_used(self):
+        return min(self.supply_cap, len(self.own_units.not_structure))
+
+    def receive(self, actions):
+        self.requests += 1
+        self.commands.extend(actions)
+        for action in actions:
+            if isinstance(action.ability, AbilityId):
+                action.unit.orders = [action.ability]
+
+    def advance(self):
+        """
+        Moves the world one step: time and income advance, and some units
+        drift and pick up or finish orders.
+        """
+        self.game_loop += GAME_LOOPS_PER_STEP
+        self.minerals += INCOME_PER_STEP
+        self.vespene += INCOME_PER_STEP // 4
+        for unit in self.rng.sample(self.own_units + self.enemy_units,
+                                    (len(self.own_units) + len(self.enemy_units)) // 4):
+            if unit.is_structure:
+                unit.orders = [] if unit.orders else [TrainAbility(SCV)]
+                continue
+            unit.position = Point2((
+                min(max(unit.position.x + self.rng.uniform(-1, 1), 0), self.map_size[0] - 1),
+                min(max(unit.position.y + self.rng.uniform(-1, 1), 0), self.map_size[1] - 1)))
+            unit.orders = [] if unit.orders else [AbilityId.HARVEST_GATHER]
+
+    def attach(self, bot):
+        """
+        Points bot at this game in place, keeping whatever state its
+        constructor set up.
+        """
+        if type(bot) not in _headless_classes.values():
+            bot.__class__ = headless_class(type(bot))
+        bot._headless_game = self
+        return bot
+
+    def run(self, bot, steps):
+        """
+        Plays steps on_step calls on bot.
+
+        :return: <dict> steps, seconds spent in on_step, steps per second,
+        commands issued and command requests made.
+        """
+        random.seed(self.seed)
+        bot = self.attach(bot)
+        loop = asyncio.new_event_loop()
+        elapsed = 0.0
+        try:
+            for iteration in range(steps):
+                self.advance()
+                start = perf_counter()
+                loop.run_until_complete(bot.on_step(iteration))
+                elapsed += perf_counter() - start
+            if hasattr(bot, "on_end"):
+                loop.run_until_complete(bot.on_end(Result.Tie))
+        finally:
+            loop.close()
+
+        return {
+            "steps": steps,
+            "seconds": elapsed,
+            "steps_per_sec": steps / elapsed if elapsed > 0 else float("inf"),
+            "commands": len(self.commands),
+            "requests": self.requests
+        }
+
+def bench(bots, description):
+    """
+    Times fresh bots over headless games of every BENCH_UNIT_COUNTS size
+    and prints one row per bot and size.
+
+    :param bots: <dict> [str: function] bot name to a function making a 
+    fresh bot.
+    :param description: <str> how the bots play, for the header line.
+    """
+    print(f"{BENCH_STEPS} headless on_step calls per run, {description}")
+    print(f"{'bot':18} {'units':>6} {'steps/s':>9} {'commands':>9} {'requests':>9}")
+    for name, make_bot in bots.items():
+        for num_units in BENCH_UNIT_COUNTS:
+            stats = HeadlessGame(num_units, BENCH_SEED).run(make_bot(), BENCH_STEPS)
+            print(f"{name:18} {num_units:>6} {stats['steps_per_sec']:>9.0f} "
+                  f"{stats['commands']:>9} {stats['requests']:>9}")
+
+def _game_property(name):
+    return property(lambda bot: getattr(bot._headless_game, name))
+
+# <dict> [type: type] headless subclasses already built, per bot class
+_headless_classes = {}
+
+def headless_class(bot_class):
+    """
+    Subclass of bot_class whose game facing BotAI members are served by the
+    bot's HeadlessGame.
+    """
+    cls = _headless_classes.get(bot_class)
+    if cls is None:
+        cls = _headless_classes[bot_class] = _make_headless_class(bot_class)
+    return cls
+
+def _make_headless_class(bot_class):
+    game = _game_property
+
+    def minerals(bot, value):
+        bot._headless_game.minerals = value
+
+    def vespene(bot, value):
+        bot._headless_game.vespene = value
+
+    def can_afford(bot, item_id):
+        minerals, vespene = COSTS.get(item_id, RESEARCH_COST)
+        return bot.minerals >= minerals and bot.vespene >= vespene
+
+    def already_pending(bot, unit_type):
+        return len(bot.units(unit_type).filter(lambda unit: not unit.is_ready))
+
+    def select_build_worker(bot, position, force=False):
+        workers = bot.workers
+        return workers.closest_to(position) if workers else None
+
+    async def build(bot, building, near=None, max_distance=20, unit=None,
+                    random_alternative=True, placement_step=2):
+        near = getattr(near, "position", near)
+        worker = unit or bot.select_build_worker(near)
+        if worker is None or not bot.can_afford(building):
+            return None
+        return await bot.do(worker.build(building, near))
+
+    async def expand_now(bot, building=None, max_distance=10, location=None):
+        location = location or min(bot.expansion_locations,
+                                   key=lambda el: el.distance_to(bot.start_location))
+        return await bot.build(building or COMMANDCENTER, near=location)
+
+    async def distribute_workers(bot):
+        if not bot.state.mineral_field:
+            return
+        for worker in bot.workers.idle:
+            await bot.do(worker.gather(bot.state.mineral_field.closest_to(worker)))
+
+    async def get_available_abilities(bot, unit):
+        return []
+
+    async def chat_send(bot, message):
+        pass
+
+    async def do(bot, action):
+        await bot._client.actions(action)
+
+    namespace = {
+        "units": game("own_units"),
+        "known_enemy_units": game("enemy_units"),
+        "known_enemy_structures": property(lambda bot: bot._headless_game.enemy_units.structure),
+        "workers": property(lambda bot: bot._headless_game.own_units(WORKERS)),
+        "townhalls": property(lambda bot: bot._headless_game.own_units(TOWNHALLS)),
+        "geysers": property(lambda bot: bot._headless_game.own_units(REFINERY)),
+        "state": game("state"),
+        "game_info": game("game_info"),
+        "_game_info": game("game_info"),
+        "_game_data": game("game_data"),
+        "_client": game("client"),
+        "start_location": game("start_location"),
+        "enemy_start_locations": property(lambda bot: [bot._headless_game.enemy_start_location]),
+        "expansion_locations": game("expansion_locations"),
+        "minerals": property(lambda bot: bot._headless_game.minerals, minerals),
+        "vespene": property(lambda bot: bot._headless_game.vespene, vespene),
+        "supply_cap": game("supply_cap"),
+        "supply_used": game("supply_used"),
+        "supply_left": property(lambda bot: bot.supply_cap - bot.supply_used),
+        "race": Race.Terran,
+        "can_afford": can_afford,
+        "already_pending": already_pending,
+        "select_build_worker": select_build_worker,
+        "build": build,
+        "expand_now": expand_now,
+        "distribute_workers": distribute_workers,
+        "get_available_abilities": get_available_abilities,
+        "chat_send": chat_send,
+    }
+    # bots that batch their commands keep their own do
+    if bot_class.do is sc2.BotAI.do:
+        namespace["do"] = do
+    return type(f"Headless{bot_class.__name__}", (bot_class,), namespace)
@@ -0,0 +1,29 @@
+from keras import backend as K
+
+import numpy as np
+
+class Predictor:
+    """
+    Single sample forward pass for acting.
+
+    Keras predict rebuilds its input batches, checks shapes and slices the
+    output for every call, which dominates at batch size 1. This instead
+    runs a backend function compiled once from the model's input to its
+    output in inference mode, feeding a reused float32 input buffer. The
+    function reads the model's variables, so later set_weights / load
+    calls on the model are picked up without rebuilding it.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._function = K.function([model.input, K.learning_phase()], [model.output])
+        self._input = np.empty((1,) + tuple(model.input_shape[1:]), np.float32)
+
+    def __call__(self, state):
+        """
+        :param state: <np.ndarray> one input, with or without a leading
+        batch axis of 1.
+        :return: <np.ndarray> the model's output for it, without batch axis.
+        """
+        self._input[0] = state.reshape(self._input.shape[1:])
+        return self._function([self._input, 0])[0][0]
@@ -0,0 +1,119 @@
+from sc2.position import Point2
+
+import json
+import os
+
+# next to the shared package, so every bot folder reads the same cache
+MAP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "maps")
+DEPOT_OFFSET = 5
+PROXY_DISTANCES = [25, 20, 30]
+# bump whenever compute changes; cached files are only loaded when both it
+# and the constants above match what they were computed with
+VERSION = 1
+# same as BotAI.EXPANSION_GAP_THRESHOLD
+EXPANSION_GAP = 15
+
+# analyses already loaded by this process, keyed like their files
+_loaded = {}
+
+class MapAnalysis:
+    """
+    Placement and scouting data that only depends on the map and the spawn
+    location, computed once and persisted per map to MAP_DIR/<key>.json
+    along with the VERSION and constants it was computed with.
+
+    - expansion_order: expansion locations, nearest to our start first.
+    - scout_route: expansion locations, nearest to the enemy start first.
+    - proxy_barracks: candidate proxy spots from the map center towards the
+      enemy start, preferred spot first.
+    - depot_ring: for each base location, the depot spot towards the map
+      center.
+    """
+
+    def __init__(self, expansion_order, scout_route, proxy_barracks, depot_ring):
+        self.expansion_order = [Point2(tuple(p)) for p in expansion_order]
+        self.scout_route = [Point2(tuple(p)) for p in scout_route]
+        self.proxy_barracks = [Point2(tuple(p)) for p in proxy_barracks]
+        self.depot_ring = {self._key(base): Point2(tuple(spot)) for base, spot in depot_ring}
+
+    @classmethod
+    def compute(cls, bot):
+        start = bot.start_location
+        enemy_start = bot.enemy_start_locations[0]
+        center = bot.game_info.map_center
+        expansions = list(bot.expansion_locations)
+
+        bases = [start] + [el for el in expansions if el.distance_to(start) > 1]
+        return cls(sorted(expansions, key=lambda el: el.distance_to(start)),
+                   sorted(expansions, key=lambda el: el.distance_to(enemy_start)),
+                   [center.towards(enemy_start, distance) for distance in PROXY_DISTANCES],
+                   [(base, base.towards(center, DEPOT_OFFSET)) for base in bases])
+
+    @classmethod
+    def load(cls, bot, directory=MAP_DIR):
+        """
+        Returns the analysis for the bot's map and spawn, from memory or disk
+        when available, computing and saving it otherwise.
+        """
+        start = bot.start_location
+        key = f"{bot.game_info.map_name}-{start.x:.1f}-{start.y:.1f}"
+        analysis = _loaded.get(key)
+        if analysis is not None:
+            return analysis
+
+        path = os.path.join(directory, key + ".json")
+        saved = None
+        if os.path.exists(path):
+            with open(path) as file:
+                saved = json.load(file)
+        if saved is not None and saved.pop("version", None) == _version():
+            analysis = cls(**saved)
+        else:
+            analysis = cls.compute(bot)
+            analysis.save(path)
+        _loaded[key] = analysis
+        return analysis
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".partial", "w") as file:
+            json.dump({
+                "version": _version(),
+                "expansion_order": [list(p) for p in self.expansion_order],
+                "scout_route": [list(p) for p in self.scout_route],
+                "proxy_barracks": [list(p) for p in self.proxy_barracks],
+                "depot_ring": [[list(base), list(spot)] for base, spot in self._depot_items()]
+            }, file)
+        os.replace(path + ".partial", path)
+
+    def next_expansion(self, townhalls):
+        """
+        Like BotAI.get_next_expansion, but ranks locations by straight line 
+        distance from the cached order, so it needs no pathing queries.
+
+        :return: <Point2> nearest expansion to our start without one of the
+        townhalls near it, or None when all of them are taken.
+        """
+        for location in self.expansion_order:
+            if not any(townhall.distance_to(location) < EXPANSION_GAP for townhall in townhalls):
+                return location
+        return None
+
+    def depot_position(self, base, center):
+        """
+        :return: <Point2> depot spot for a townhall at base, falling back to
+        placing it towards center for bases the analysis doesn't know.
+        """
+        spot = self.depot_ring.get(self._key(base))
+        return spot if spot is not None else base.towards(center, DEPOT_OFFSET)
+
+    def _depot_items(self):
+        for (x, y), spot in self.depot_ring.items():
+            yield Point2((x, y)), spot
+
+    @staticmethod
+    def _key(position):
+        return (round(position[0]), round(position[1]))
+
+def _version():
+    return [VERSION, DEPOT_OFFSET, PROXY_DISTANCES]
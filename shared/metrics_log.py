@@ -0,0 +1,134 @@
+import json
+import os
+from time import time
+
+import numpy as np
+
+RESULT_CODES = {"Result.Victory": 1, "Result.Tie": 0, "Result.Defeat": -1}
+UNKNOWN_RESULT = -2
+# actions and any phase not in the schema are summed into these
+ACTION_PHASE = "actions"
+OTHER_PHASE = "other"
+
+def episode_dtype(phases):
+    """
+    Fixed record layout of one episode; per-phase seconds are a subarray
+    ordered like phases.
+    """
+    return np.dtype([
+        ("episode", np.int32),
+        ("seed", np.int64),
+        ("result", np.int8),
+        ("epsilon", np.float32),
+        ("reward", np.float64),
+        ("steps", np.int32),
+        ("wall_time", np.float64),
+        ("finished_at", np.float64),
+        ("replay_size", np.int64),
+        ("learner_steps", np.int64),
+        ("learner_steps_per_sec", np.float32),
+        ("queue_depth", np.int32),
+        ("policy_staleness", np.int32),
+        ("commands_sent", np.int64),
+        ("requests_sent", np.int64),
+        ("phase_seconds", np.float32, (len(phases),))
+    ])
+
+def _schema_path(path):
+    return path + ".json"
+
+def _schema(phases):
+    # the field names too, so logs written before a layout change are refused
+    return {"phases": phases, "fields": list(episode_dtype(phases).names)}
+
+def read_metrics(path):
+    """
+    Memory maps every complete record of a metrics log.
+
+    :return: <tuple> (structured (N,) np.memmap, <list> phase names of
+    the phase_seconds columns).
+    """
+    with open(_schema_path(path)) as schema:
+        schema = json.load(schema)
+    phases = schema["phases"]
+    if schema != _schema(phases):
+        raise ValueError(f"{path} was written with a different record layout")
+    dtype = episode_dtype(phases)
+
+    count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    if count == 0:
+        return np.zeros(0, dtype), phases
+    return np.memmap(path, dtype, mode="r", shape=(count,)), phases
+
+class MetricsLog:
+    """
+    Append-only binary log of fixed-schema episode records.
+
+    Records are staged in a preallocated structured buffer and written
+    with one write call every flush_every episodes, through a file handle
+    kept open for the whole run. The schema (phase names) lives in a json
+    sidecar so readers can np.memmap the records directly.
+    """
+
+    def __init__(self, path, phases, flush_every=16):
+        self.path = path
+        self.phases = list(phases) + [ACTION_PHASE, OTHER_PHASE]
+        self.dtype = episode_dtype(self.phases)
+        self._phase_index = {name: i for i, name in enumerate(self.phases)}
+
+        schema_path = _schema_path(path)
+        if os.path.exists(schema_path):
+            with open(schema_path) as schema:
+                if json.load(schema) != _schema(self.phases):
+                    raise ValueError(f"{path} was written with different phases or fields")
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(schema_path, "w") as schema:
+                json.dump(_schema(self.phases), schema)
+
+        # drop a record torn by a crash mid write
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            if size % self.dtype.itemsize:
+                with open(path, "r+b") as log:
+                    log.truncate(size - size % self.dtype.itemsize)
+
+        self.file = open(path, "ab")
+        self._buffer = np.zeros(flush_every, self.dtype)
+        self._buffered = 0
+
+    def append(self, episode, result, phase_totals=None, **fields):
+        """
+        Stages one episode record; fields not given are left zero.
+
+        :param result: <Result> or its str(), stored as a RESULT_CODES code.
+        :param phase_totals: <dict> [str: float] seconds per profiled phase,
+        as from StepProfiler.totals().
+        """
+        # a length 1 slice, so field assignments write through to the buffer
+        record = self._buffer[self._buffered:self._buffered + 1]
+        record[0] = 0
+        record["episode"] = episode
+        record["result"] = RESULT_CODES.get(str(result), UNKNOWN_RESULT)
+        record["finished_at"] = time()
+        for name, seconds in (phase_totals or {}).items():
+            if name.startswith("action."):
+                name = ACTION_PHASE
+            record["phase_seconds"][0, self._phase_index.get(name, self._phase_index[OTHER_PHASE])] += seconds
+        for name, value in fields.items():
+            record[name] = value
+
+        self._buffered += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+        self.file.write(self._buffer[:self._buffered].tobytes())
+        self.file.flush()
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
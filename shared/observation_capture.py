@@ -0,0 +1,219 @@
+from sc2.data import ActionResult
+from sc2.game_state import GameState
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from shared.profiler import StepProfiler
+
+import asyncio
+import gzip
+import os
+import pickle
+import struct
+from time import perf_counter
+
+import numpy as np
+
+MAGIC = b"SC2OBS1\n"
+# per step record header: on_step iteration, observation size in bytes
+STEP_HEADER = struct.Struct("<II")
+SIZE = struct.Struct("<I")
+# steps listed by replay_into
+SLOWEST_STEPS = 10
+
+class ObservationCapture:
+    """
+    Streams every raw observation a bot sees during a real game to a
+    gzipped capture file, for ObservationReplay to feed back offline.
+
+    The file starts with the pickled game info, game data and player id
+    of the first step, followed by one record per on_step: the iteration
+    and the serialized Observation proto. Nothing is written until the
+    first record, and the file only appears under path once closed.
+    """
+
+    def __init__(self, path, compresslevel=1):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.compresslevel = compresslevel
+        self.file = None
+        self.steps = 0
+
+    def record(self, bot, iteration):
+        """
+        Appends the bot's current observation; call first thing in on_step.
+        """
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = gzip.open(self.partial_path, "wb", compresslevel=self.compresslevel)
+            header = pickle.dumps({
+                "player_id": bot.player_id,
+                "game_info": bot._game_info,
+                "game_data": bot._game_data
+            }, pickle.HIGHEST_PROTOCOL)
+            self.file.write(MAGIC + SIZE.pack(len(header)) + header)
+
+        observation = bot.state.observation.SerializeToString()
+        self.file.write(STEP_HEADER.pack(iteration, len(observation)) + observation)
+        self.steps += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.replace(self.partial_path, self.path)
+
+def _read_header(file, path):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not an observation capture")
+    return pickle.loads(file.read(SIZE.unpack(file.read(SIZE.size))[0]))
+
+def read_capture_header(path):
+    """
+    :return: <dict> the capture's player_id, game_info and game_data.
+    """
+    with gzip.open(path, "rb") as file:
+        return _read_header(file, path)
+
+def iter_capture(path):
+    """
+    Streams a capture's steps without holding the whole game in memory.
+
+    :return: <generator> (<int> iteration, <bytes> serialized Observation)
+    per recorded step; a record torn by a crash ends the stream.
+    """
+    with gzip.open(path, "rb") as file:
+        _read_header(file, path)
+        while True:
+            record = file.read(STEP_HEADER.size)
+            if len(record) < STEP_HEADER.size:
+                return
+            iteration, size = STEP_HEADER.unpack(record)
+            observation = file.read(size)
+            if len(observation) < size:
+                return
+            yield iteration, observation
+
+class ReplayClient:
+    """
+    Stands in for the game client during a replay: commands are counted
+    and dropped, and queries get permissive answers, since the recorded
+    game doesn't react to them anyway.
+    """
+
+    def __init__(self):
+        self.commands = 0
+        self.requests = 0
+
+    async def actions(self, actions, game_data=None, return_successes=False):
+        self.commands += len(actions) if isinstance(actions, list) else 1
+        self.requests += 1
+        return []
+
+    async def query_building_placement(self, ability, positions, ignore_resources=True):
+        return [ActionResult.Success for _ in positions]
+
+    async def query_available_abilities(self, units, ignore_resource_requirements=False):
+        return [[] for _ in units] if isinstance(units, list) else []
+
+    async def query_pathing(self, start, end):
+        return getattr(start, "position", start).distance_to(end)
+
+    async def chat_send(self, message, team_only):
+        pass
+
+class ObservationReplay:
+    """
+    Feeds a capture's observations to a bot as fast as it can step, so any
+    stretch of a game can be profiled offline and bot builds compared on
+    identical input.
+
+    The bot still acts, but its commands go nowhere: the observations that
+    follow are the recorded ones, not the consequences of what it did.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_capture_header(path)
+        self.player_id = header["player_id"]
+        self.game_info = header["game_info"]
+        self.game_data = header["game_data"]
+
+    def states(self, stop=None):
+        """
+        :return: <generator> (<int> iteration, <GameState>) per recorded
+        step, up to stop steps.
+        """
+        for i, (iteration, observation) in enumerate(iter_capture(self.path)):
+            if i == stop:
+                return
+            response = sc_pb.ResponseObservation()
+            response.observation.ParseFromString(observation)
+            yield iteration, GameState(response, self.game_data)
+
+    def run(self, bot, start=0, stop=None):
+        """
+        Replays the capture into a freshly constructed bot. Steps before
+        start are still played, untimed, so the bot reaches them in the
+        state it had in the real game.
+
+        :return: <dict> steps timed, seconds spent in on_step, steps per
+        second, per-step seconds and the commands and requests the bot
+        sent over the timed steps.
+        """
+        client = ReplayClient()
+        bot._prepare_start(client, self.player_id, self.game_info, self.game_data)
+        loop = asyncio.new_event_loop()
+        try:
+            started = bot.on_start()
+            if asyncio.iscoroutine(started):
+                loop.run_until_complete(started)
+
+            step_seconds = []
+            commands = requests = 0
+            for i, (iteration, state) in enumerate(self.states(stop)):
+                bot._prepare_step(state)
+                if i == 0:
+                    bot._prepare_first_step()
+                if i == start:
+                    commands, requests = client.commands, client.requests
+
+                begin = perf_counter()
+                loop.run_until_complete(bot.on_step(iteration))
+                if i >= start:
+                    step_seconds.append(perf_counter() - begin)
+        finally:
+            loop.close()
+
+        step_seconds = np.array(step_seconds)
+        elapsed = step_seconds.sum()
+        return {
+            "steps": len(step_seconds),
+            "seconds": elapsed,
+            "steps_per_sec": len(step_seconds) / elapsed if elapsed > 0 else float("inf"),
+            "step_seconds": step_seconds,
+            "commands": client.commands - commands if len(step_seconds) else 0,
+            "requests": client.requests - requests if len(step_seconds) else 0
+        }
+
+def replay_into(bot, name, path, start=0, stop=None):
+    """
+    Replays a capture into a freshly constructed bot, profiling its phases,
+    and prints its step throughput, slowest steps and per-phase profile
+    over steps [start, stop).
+
+    :param name: <str> what to call the bot in the report.
+    """
+    bot.profiler = StepProfiler()
+    stats = ObservationReplay(path).run(bot, start, stop)
+
+    step_seconds = stats["step_seconds"]
+    print(f"{name}: {stats['steps']} steps from step {start}, "
+          f"{stats['steps_per_sec']:.0f} steps/s, "
+          f"p50 {np.percentile(step_seconds, 50) * 1e3:.2f} ms, "
+          f"p99 {np.percentile(step_seconds, 99) * 1e3:.2f} ms")
+    print(f"commands: {stats['commands']} in {stats['requests']} requests")
+    print("slowest steps: " + ", ".join(
+        f"{start + i} ({step_seconds[i] * 1e3:.1f} ms)"
+        for i in np.argsort(step_seconds)[::-1][:SLOWEST_STEPS]))
+    for line in bot.profiler.summary():
+        print(line)
@@ -0,0 +1,143 @@
+import math
+from time import perf_counter
+
+import numpy as np
+
+# latency buckets start at 1us and grow by 2**(1/4), topping out near 2 minutes
+MIN_LATENCY = 1e-6
+BUCKETS_PER_DOUBLING = 4
+NUM_BUCKETS = 27 * BUCKETS_PER_DOUBLING
+
+class LatencyHistogram:
+    """
+    Log bucketed latency histogram; percentiles are read off bucket edges,
+    so they are accurate to within one bucket (~19%).
+    """
+
+    def __init__(self):
+        # a plain list: numpy scalar increments cost more than the timing
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = int(math.log2(max(seconds, MIN_LATENCY) / MIN_LATENCY) * BUCKETS_PER_DOUBLING)
+        self.counts[min(bucket, NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        :return: <float> upper edge in seconds of the bucket holding the
+        q-th percentile.
+        """
+        if self.count == 0:
+            return 0.0
+        bucket = np.searchsorted(np.cumsum(self.counts), q / 100 * self.count)
+        return min(self.max, MIN_LATENCY * 2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING))
+
+class PhaseTimer:
+    """
+    Reusable context manager timing one phase into its histogram. Phases
+    may await inside the block; the time spent waiting on the game counts.
+    """
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.record(perf_counter() - self.start)
+
+class StepProfiler:
+    """
+    Per-phase latency histograms for one episode of a bot's on_step.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self._timers = {}
+
+    def phase(self, name):
+        timer = self._timers.get(name)
+        if timer is None:
+            self.histograms[name] = LatencyHistogram()
+            timer = self._timers[name] = PhaseTimer(self.histograms[name])
+        return timer
+
+    def summary(self):
+        """
+        :return: <list> [str] one line per phase, most total time first.
+        """
+        lines = [f"{'phase':<40} {'calls':>7} {'total (s)':>10} {'mean (ms)':>10} "
+                 f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}"]
+        phases = sorted(self.histograms.items(), key=lambda item: -item[1].total)
+        for name, histogram in phases:
+            lines.append(f"{name:<40} {histogram.count:>7} {histogram.total:>10.3f} "
+                         f"{histogram.total / histogram.count * 1e3:>10.3f} "
+                         f"{histogram.percentile(50) * 1e3:>9.3f} "
+                         f"{histogram.percentile(99) * 1e3:>9.3f} "
+                         f"{histogram.max * 1e3:>9.3f}")
+        return lines
+
+    def totals(self):
+        """
+        :return: <dict> [str: float] total seconds spent in each phase.
+        """
+        return {name: histogram.total for name, histogram in self.histograms.items()}
+
+    def write_summary(self, path, title):
+        with open(path, "a") as log:
+            log.write(f"{title}\n")
+            for line in self.summary():
+                log.write(f"    {line}\n")
+
+class _TotalTimer:
+    __slots__ = ("totals", "name", "start")
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.totals[self.name] += perf_counter() - self.start
+
+class PhaseTotals:
+    """
+    Used when profiling is off: keeps only the total seconds per phase, 
+    which cost two clock reads per phase, so the metrics log still gets 
+    real per-phase timings.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._timers = {}
+
+    def phase(self, name):
+        timer = self._timers.get(name)
+        if timer is None:
+            self._totals[name] = 0.0
+            timer = self._timers[name] = _TotalTimer(self._totals, name)
+        return timer
+
+    def totals(self):
+        return dict(self._totals)
+
+    def write_summary(self, path, title):
+        pass
+
+def make_profiler(enabled):
+    return StepProfiler() if enabled else PhaseTotals()
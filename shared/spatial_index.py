@@ -0,0 +1,138 @@
+from sc2.constants import SCV, DRONE, PROBE
+
+import numpy as np
+
+WORKER_TYPES = {SCV, DRONE, PROBE}
+CELL_SIZE = 8.0
+
+class SpatialIndex:
+    """
+    Uniform grid over a fixed group of units for radius and nearest
+    queries.
+
+    Unit positions are bucketed into square cells and stored sorted by
+    cell, so the units of a run of cells along one grid row are one
+    contiguous slice. A query only measures the units in the cells its
+    radius overlaps rather than every unit in the group.
+    """
+
+    def __init__(self, units, cell_size=CELL_SIZE):
+        self.units = units
+        self.cell_size = cell_size
+        self.positions = np.array([unit.position for unit in units], np.float64).reshape(-1, 2)
+        if len(units) == 0:
+            return
+
+        self.origin = self.positions.min(axis=0)
+        cells = ((self.positions - self.origin) // cell_size).astype(np.intp)
+        self.shape = cells.max(axis=0) + 1
+
+        cell_ids = cells[:, 1] * self.shape[0] + cells[:, 0]
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.sorted_positions = self.positions[self.order]
+        self.cell_starts = np.zeros(self.shape[0] * self.shape[1] + 1, np.intp)
+        np.cumsum(np.bincount(cell_ids, minlength=len(self.cell_starts) - 1),
+                  out=self.cell_starts[1:])
+
+    def __len__(self):
+        return len(self.units)
+
+    @property
+    def exists(self):
+        return len(self.units) > 0
+
+    def _within(self, center, radius):
+        """
+        :return: <tuple> (indices into units, distances) of the units
+        strictly closer than radius to center.
+        """
+        if len(self.units) == 0:
+            return np.zeros(0, np.intp), np.zeros(0)
+
+        low = np.maximum(((center - radius - self.origin) // self.cell_size).astype(np.intp), 0)
+        high = np.minimum(((center + radius - self.origin) // self.cell_size).astype(np.intp),
+                          self.shape - 1)
+        if np.any(low > high):
+            return np.zeros(0, np.intp), np.zeros(0)
+
+        row_starts = np.arange(low[1], high[1] + 1) * self.shape[0]
+        starts = self.cell_starts[row_starts + low[0]]
+        ends = self.cell_starts[row_starts + high[0] + 1]
+        candidates = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+
+        distances = np.hypot(*(self.sorted_positions[candidates] - center).T)
+        inside = distances < radius
+        return self.order[candidates[inside]], distances[inside]
+
+    def closer_than(self, distance, position):
+        """
+        :return: <Units> units strictly closer than distance to position,
+        like Units.closer_than.
+        """
+        indices, _ = self._within(self._point(position), distance)
+        return self.units.subgroup(self.units[i] for i in np.sort(indices))
+
+    def closest_to(self, position):
+        """
+        :return: <Unit> the unit nearest to position, or None if there are
+        no units. Searches growing radii, so nearby hits stay cheap.
+        """
+        if len(self.units) == 0:
+            return None
+
+        center = self._point(position)
+        # farthest any unit can be from the center
+        reach = np.hypot(*np.maximum(np.abs(self.positions - center).max(axis=0), 1))
+        radius = self.cell_size
+        while True:
+            indices, distances = self._within(center, radius)
+            if len(indices) > 0:
+                return self.units[int(indices[np.argmin(distances)])]
+            if radius > reach:
+                # only reachable through float ties on the search boundary
+                return self.units[int(np.argmin(np.hypot(*(self.positions - center).T)))]
+            radius *= 2
+
+    @staticmethod
+    def _point(position):
+        position = getattr(position, "position", position)
+        return np.array([position[0], position[1]], np.float64)
+
+class StepIndices:
+    """
+    Spatial indices over the observation, built lazily at most once per
+    step and dropped by reset at the top of on_step.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._indices = {}
+
+    def reset(self):
+        self._indices = {}
+
+    def _index(self, name, units_fn):
+        index = self._indices.get(name)
+        if index is None:
+            index = self._indices[name] = SpatialIndex(units_fn())
+        return index
+
+    @property
+    def enemies(self):
+        return self._index("enemies", lambda: self.bot.known_enemy_units)
+
+    @property
+    def threats(self):
+        """
+        Known enemy units other than workers.
+        """
+        return self._index("threats", lambda: self.bot.known_enemy_units.filter(
+            lambda unit: unit.type_id not in WORKER_TYPES))
+
+    @property
+    def geysers(self):
+        return self._index("geysers", lambda: self.bot.state.vespene_geyser)
+
+    @property
+    def minerals(self):
+        return self._index("minerals", lambda: self.bot.state.mineral_field)
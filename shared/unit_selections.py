@@ -0,0 +1,69 @@
+class UnitSelections:
+    """
+    Per step memo of typed unit selections.
+
+    The first typed lookup in a step groups every unit by type id in one
+    pass; each selection (by type, ready, idle, noqueue) is then built once
+    and shared by every helper that asks for it until the next reset.
+    Selections are plain Units groups and must not be modified.
+    """
+
+    def __init__(self):
+        self.units = None
+        self._by_type = None
+        self._selections = {}
+
+    def reset(self, units):
+        """
+        Drops last step's selections; call once at the top of on_step.
+        """
+        self.units = units
+        self._by_type = None
+        self._selections = {}
+
+    def __call__(self, unit_types):
+        """
+        :param unit_types: <UnitId> or <list> [UnitId].
+        :return: <Units> units of the given type(s), like Units.of_type.
+        """
+        key = self._key(unit_types)
+        selection = self._selections.get(key)
+        if selection is None:
+            if self._by_type is None:
+                self._by_type = {}
+                for unit in self.units:
+                    self._by_type.setdefault(unit.type_id, []).append(unit)
+
+            if isinstance(key, frozenset):
+                selection = self.units.subgroup(
+                    unit for unit_type in key for unit in self._by_type.get(unit_type, ()))
+            else:
+                selection = self.units.subgroup(self._by_type.get(key, ()))
+            self._selections[key] = selection
+        return selection
+
+    def ready(self, unit_types):
+        return self._filtered("ready", unit_types)
+
+    def idle(self, unit_types):
+        return self._filtered("idle", unit_types)
+
+    def noqueue(self, unit_types):
+        return self._filtered("noqueue", unit_types)
+
+    def ready_noqueue(self, unit_types):
+        return self._filtered("noqueue", unit_types, within="ready")
+
+    def _filtered(self, state, unit_types, within=None):
+        key = (within, state, self._key(unit_types))
+        selection = self._selections.get(key)
+        if selection is None:
+            units = self(unit_types) if within is None else self._filtered(within, unit_types)
+            selection = self._selections[key] = getattr(units, state)
+        return selection
+
+    @staticmethod
+    def _key(unit_types):
+        if isinstance(unit_types, (list, tuple, set, frozenset)):
+            return frozenset(unit_types)
+        return unit_types